@@ -0,0 +1,182 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.database import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Максимальное количество ответов в кэше; 0 отключает кэш
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', 256))
+# Время жизни ответа (секунды)
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', 3600))
+# Порог косинусной близости вопросов для семантического попадания; 0 отключает его
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.95))
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    start_ts: float
+    end_ts: float
+    doc_ids: frozenset
+    embedding: Optional[np.ndarray]
+    created_at: float
+
+class AnswerCache:
+    """
+    LRU-кэш ответов модели с ограниченным временем жизни
+
+    Ключ - нормализованный вопрос, диапазон дат и набор найденных документов,
+    поэтому ответ переиспользуется только для того же контекста. Вопрос,
+    сформулированный иначе, но близкий по эмбеддингу и давший тот же набор
+    документов, тоже считается попаданием. Ответы, в диапазон дат которых
+    попали новые документы, удаляются через invalidate.
+    """
+
+    def __init__(
+        self,
+        max_size: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL_SECONDS,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY
+    ):
+        """
+        Args:
+            max_size: Максимальное количество ответов
+            ttl: Время жизни ответа в секундах
+            similarity_threshold: Порог косинусной близости вопросов (0 - только точное совпадение)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple, CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @staticmethod
+    def _key(question: str, start_ts: float, end_ts: float, doc_ids: Iterable[str]) -> Tuple:
+        return (normalize_text(question), start_ts, end_ts, frozenset(doc_ids))
+
+    @staticmethod
+    def _normalize_vector(embedding) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expired(self, entry: CachedAnswer, now: float) -> bool:
+        return now - entry.created_at > self.ttl
+
+    def get(
+        self,
+        question: str,
+        start_ts: float,
+        end_ts: float,
+        doc_ids: Iterable[str],
+        embedding: List[float] = None
+    ) -> Optional[str]:
+        """
+        Возвращает сохраненный ответ или None
+
+        Args:
+            question: Вопрос пользователя
+            start_ts: Начало диапазона дат (timestamp)
+            end_ts: Конец диапазона дат (timestamp)
+            doc_ids: Идентификаторы найденных документов
+            embedding: Эмбеддинг вопроса для семантического поиска
+
+        Returns:
+            Optional[str]: Ответ или None, если его нет в кэше
+        """
+        if not self.enabled:
+            return None
+        key = self._key(question, start_ts, end_ts, doc_ids)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+
+            if entry is None and embedding is not None and self.similarity_threshold > 0:
+                vector = self._normalize_vector(embedding)
+                best_similarity = self.similarity_threshold
+                for candidate_key, candidate in self._entries.items():
+                    if (candidate.start_ts, candidate.end_ts, candidate.doc_ids) != key[1:]:
+                        continue
+                    if candidate.embedding is None or self._expired(candidate, now):
+                        continue
+                    similarity = float(np.dot(vector, candidate.embedding))
+                    if similarity >= best_similarity:
+                        best_similarity, key, entry = similarity, candidate_key, candidate
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            hits, total = self.hits, self.hits + self.misses
+        logger.info(f"Кэш ответов: попаданий {hits} из {total} ({hits / total:.0%})")
+        return entry.answer if entry is not None else None
+
+    def put(
+        self,
+        question: str,
+        start_ts: float,
+        end_ts: float,
+        doc_ids: Iterable[str],
+        answer: str,
+        embedding: List[float] = None
+    ):
+        """Сохраняет ответ, вытесняя давно не использованные"""
+        if not self.enabled:
+            return
+        key = self._key(question, start_ts, end_ts, doc_ids)
+        entry = CachedAnswer(
+            answer=answer,
+            start_ts=start_ts,
+            end_ts=end_ts,
+            doc_ids=key[3],
+            embedding=self._normalize_vector(embedding),
+            created_at=time.monotonic()
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, timestamps: Iterable[float]) -> int:
+        """
+        Удаляет ответы, в диапазон дат которых попадают новые документы
+
+        Args:
+            timestamps: Даты публикации добавленных документов (timestamp)
+
+        Returns:
+            int: Количество удаленных ответов
+        """
+        timestamps = sorted(timestamps)
+        if not timestamps or not self._entries:
+            return 0
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if np.searchsorted(timestamps, entry.start_ts) < np.searchsorted(timestamps, entry.end_ts, side='right')
+            ]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            logger.info(f"Кэш ответов: удалено {len(stale)} устаревших ответов")
+        return len(stale)
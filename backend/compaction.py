@@ -0,0 +1,225 @@
+import os
+import re
+import json
+import gzip
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from backend.database import get_ingest_manifest, replace_ingest_manifest_entries
+from backend.news_fetcher import parse_message, is_jsonl_file
+
+logger = logging.getLogger(__name__)
+
+# Уплотнение запускается, когда у канала накопилось столько файлов загрузчика
+COMPACTION_MIN_FILES = int(os.getenv('COMPACTION_MIN_FILES', 50))
+# Самые свежие файлы загрузчика не трогаются
+COMPACTION_KEEP_RECENT_FILES = int(os.getenv('COMPACTION_KEEP_RECENT_FILES', 5))
+# Сегменты за дни старше этого порога сжимаются gzip
+COMPACTION_COLD_DAYS = int(os.getenv('COMPACTION_COLD_DAYS', 2))
+
+_LINK_MESSAGE_ID = re.compile(r'/(\d+)$')
+
+def segment_name(day: str, compressed: bool) -> str:
+    """Имя файла сегмента за день в формате YYYYMMDD"""
+    return f"segment_{day}.jsonl.gz" if compressed else f"segment_{day}.jsonl"
+
+def read_records(file_path: Path, channel: str) -> Iterator[Dict]:
+    """
+    Читает сообщения файла выгрузки в виде записей структурированного формата
+
+    Args:
+        file_path: Файл загрузчика (txt или jsonl) или сегмент
+        channel: Имя канала
+
+    Yields:
+        Dict: Запись с ключами id, date, channel, link, views, edit_date, text
+    """
+    if is_jsonl_file(file_path):
+        opener = gzip.open if file_path.suffix == '.gz' else open
+        with opener(file_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                # Некорректная строка (например, обрезанная при сбое) пропускается,
+                # иначе уплотнение канала падало бы в каждом цикле
+                try:
+                    record = json.loads(line)
+                    _record_day(record)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    logger.warning(f"Пропуск некорректной записи в {file_path.name}: {e!r}")
+                    continue
+                yield record
+        return
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for message in parse_message(f):
+            match = _LINK_MESSAGE_ID.search(message['message_link'] or '')
+            yield {
+                'id': int(match.group(1)) if match else None,
+                'date': message['timestamp'].isoformat(),
+                'channel': channel,
+                'link': message['message_link'],
+                'views': None,
+                'edit_date': None,
+                'text': message['text']
+            }
+
+def _record_day(record: Dict) -> str:
+    """День публикации сообщения (UTC) в формате YYYYMMDD"""
+    return datetime.fromisoformat(record['date']).astimezone(timezone.utc).strftime('%Y%m%d')
+
+def _record_key(record: Dict):
+    """Ключ дедупликации: идентификатор сообщения, а без него - дата и текст"""
+    if record.get('id') is not None:
+        return record['id']
+    return (record['date'], record['text'])
+
+def _write_segment(path: Path, records: List[Dict]):
+    """Атомарно записывает упорядоченные по времени записи в сегмент"""
+    partial_path = path.with_name(path.name + '.part')
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(partial_path, 'wt', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(partial_path, path)
+
+def _is_processed(path: Path, entry: Dict) -> bool:
+    """Проверяет по манифесту, что файл прочитан целиком и с тех пор не менялся"""
+    if entry is None:
+        return False
+    stat = path.stat()
+    return entry['offset'] >= stat.st_size and entry['mtime'] == stat.st_mtime
+
+def compact_channel(
+    channel_dir: Path,
+    channel: str,
+    base_dir: Path,
+    manifest: Dict[str, Dict],
+    min_files: int = COMPACTION_MIN_FILES,
+    keep_recent: int = COMPACTION_KEEP_RECENT_FILES,
+    cold_days: int = COMPACTION_COLD_DAYS
+) -> int:
+    """
+    Объединяет файлы загрузчика канала в дневные сегменты без дубликатов
+
+    Сообщения каждого дня сливаются с уже существующим сегментом этого дня,
+    упорядочиваются по времени, а сегменты старше cold_days дней сжимаются.
+    Если все исходные файлы сегмента уже были прочитаны, новый сегмент
+    отмечается в манифесте как прочитанный, чтобы не разбирать его повторно.
+
+    Args:
+        channel_dir: Папка канала
+        channel: Имя канала
+        base_dir: Корневая папка выгрузки (пути в манифесте хранятся относительно нее)
+        manifest: Манифест обработанных файлов
+        min_files: Минимальное число файлов загрузчика для запуска уплотнения
+        keep_recent: Количество самых свежих файлов, которые не уплотняются
+        cold_days: Возраст дня в сутках, после которого сегмент сжимается
+
+    Returns:
+        int: Количество удаленных исходных файлов
+    """
+    download_files = sorted(
+        [*channel_dir.glob('messages*.txt'), *channel_dir.glob('messages*.jsonl')],
+        key=lambda x: (x.stat().st_mtime, x.name)
+    )
+    sources = download_files[:max(len(download_files) - keep_recent, 0)]
+    cold_day = (datetime.now(timezone.utc) - timedelta(days=cold_days)).strftime('%Y%m%d')
+
+    warm_segments = list(channel_dir.glob('segment_*.jsonl'))
+    # Теплые сегменты за остывшие дни сжимаются даже без новых файлов
+    stale_segments = [path for path in warm_segments if path.name[8:16] < cold_day]
+    if len(sources) < min_files and not stale_segments:
+        return 0
+
+    if len(sources) < min_files:
+        sources = []
+
+    def relative(path: Path) -> str:
+        return path.relative_to(base_dir).as_posix()
+
+    # Группируем сообщения исходных файлов по дням; более поздние файлы
+    # перекрывают более ранние (например, отредактированные сообщения)
+    days: Dict[str, Dict] = {}
+    day_sources: Dict[str, set] = {}
+    for path in sources:
+        for record in read_records(path, channel):
+            day = _record_day(record)
+            days.setdefault(day, {})[_record_key(record)] = record
+            day_sources.setdefault(day, set()).add(path)
+    for path in stale_segments:
+        day_sources.setdefault(path.name[8:16], set())
+
+    for day in sorted(day_sources):
+        compressed = day < cold_day
+        existing = [
+            path for path in (channel_dir / segment_name(day, False), channel_dir / segment_name(day, True))
+            if path.exists()
+        ]
+
+        merged: Dict = {}
+        for path in existing:
+            for record in read_records(path, channel):
+                merged[_record_key(record)] = record
+        merged.update(days.get(day, {}))
+
+        contributors = existing + sorted(day_sources[day])
+        processed = all(_is_processed(path, manifest.get(relative(path))) for path in contributors)
+
+        records = sorted(merged.values(), key=lambda record: (record['date'], record.get('id') or 0))
+        segment_path = channel_dir / segment_name(day, compressed)
+        _write_segment(segment_path, records)
+
+        for path in existing:
+            if path != segment_path:
+                path.unlink()
+
+        stat = segment_path.stat()
+        replace_ingest_manifest_entries(
+            [relative(path) for path in existing],
+            {
+                'path': relative(segment_path),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'offset': stat.st_size
+            } if processed else None
+        )
+
+    # Исходные файлы удаляются только после записи всех сегментов
+    for path in sources:
+        path.unlink()
+    replace_ingest_manifest_entries([relative(path) for path in sources])
+
+    logger.info(
+        f"Канал {channel}: уплотнено {len(sources)} файлов в {len(day_sources)} сегментов"
+    )
+    return len(sources)
+
+def compact_data_dir(data_dir: str, channels: List[str]) -> int:
+    """
+    Уплотняет файлы выгрузки всех каналов
+
+    Запускается после разбора новых файлов, чтобы уже прочитанные файлы
+    заменялись сегментами без повторного разбора.
+
+    Args:
+        data_dir: Корневая папка выгрузки Telegram
+        channels: Список каналов
+
+    Returns:
+        int: Общее количество удаленных исходных файлов
+    """
+    base_dir = Path(data_dir)
+    manifest = get_ingest_manifest()
+    removed = 0
+    for channel in channels:
+        channel_dir = base_dir / channel
+        if not channel_dir.exists():
+            continue
+        try:
+            removed += compact_channel(channel_dir, channel, base_dir, manifest)
+        except Exception as e:
+            logger.error(f"Ошибка при уплотнении файлов канала {channel}: {str(e)}")
+    return removed
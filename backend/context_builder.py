@@ -0,0 +1,121 @@
+import os
+import logging
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from langchain.schema import Document
+
+from backend.database import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Сколько кандидатов запрашивается у поиска для отбора в контекст
+CONTEXT_CANDIDATES = int(os.getenv('CONTEXT_CANDIDATES', 20))
+# Максимальное количество новостей в контексте
+CONTEXT_MAX_DOCS = int(os.getenv('CONTEXT_MAX_DOCS', 5))
+# Бюджет контекста в токенах (оценка)
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1500))
+# Максимальная длина одной новости в токенах, длинные посты обрезаются
+CONTEXT_MAX_DOC_TOKENS = int(os.getenv('CONTEXT_MAX_DOC_TOKENS', 400))
+# Баланс релевантности и разнообразия в MMR (1 - только релевантность)
+CONTEXT_MMR_LAMBDA = float(os.getenv('CONTEXT_MMR_LAMBDA', 0.7))
+# Новости с большей похожестью слов на уже выбранную считаются дубликатами
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv('CONTEXT_DUPLICATE_SIMILARITY', 0.8))
+
+# Среднее число символов на токен для русского текста
+CHARS_PER_TOKEN = 3.5
+# Остаток бюджета, при котором отбор новостей прекращается
+MIN_DOC_TOKENS = 50
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительное число токенов текста по его длине"""
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Обрезает текст до примерного числа токенов по границе слова"""
+    limit = int(tokens * CHARS_PER_TOKEN)
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(' ', 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + '…'
+
+def _similarity(words_a: frozenset, words_b: frozenset) -> float:
+    """Коэффициент Жаккара для множеств слов"""
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+@dataclass
+class ContextSelection:
+    documents: List[Tuple[Document, float]] = field(default_factory=list)
+    candidates: int = 0
+    duplicates: int = 0
+    tokens: int = 0
+    baseline_tokens: int = 0
+
+def build_context(
+    candidates: List[Tuple[Document, float]],
+    max_docs: int = CONTEXT_MAX_DOCS,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    max_doc_tokens: int = CONTEXT_MAX_DOC_TOKENS,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+    duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY
+) -> ContextSelection:
+    """
+    Отбирает новости для контекста модели
+
+    Кандидаты упорядочены поиском от наиболее релевантного. Новости выбираются
+    по MMR: релевантность (по рангу) штрафуется за похожесть слов на уже
+    выбранные, а почти совпадающие (репосты) отбрасываются совсем. Выбранные
+    новости обрезаются до max_doc_tokens и до равной доли оставшегося
+    бюджета, чтобы вместе уложиться в token_budget.
+
+    Args:
+        candidates: Пары (документ, оценка) от поиска
+        max_docs: Максимальное количество новостей
+        token_budget: Бюджет токенов на тексты новостей
+        max_doc_tokens: Максимальная длина одной новости в токенах
+        mmr_lambda: Вес релевантности в MMR
+        duplicate_similarity: Порог похожести, начиная с которого новость считается дубликатом
+
+    Returns:
+        ContextSelection: Выбранные пары (документ, оценка) и статистика по токенам
+    """
+    selection = ContextSelection(candidates=len(candidates))
+    # Прежний способ: первые max_docs новостей целиком
+    selection.baseline_tokens = sum(estimate_tokens(doc.page_content) for doc, _ in candidates[:max_docs])
+
+    words = [frozenset(normalize_text(doc.page_content).split()) for doc, _ in candidates]
+    relevance = [1 - rank / len(candidates) for rank in range(len(candidates))]
+    remaining = list(range(len(candidates)))
+    selected: List[int] = []
+    budget = token_budget
+
+    while remaining and len(selected) < max_docs and budget >= MIN_DOC_TOKENS:
+        best, best_score = None, None
+        for i in list(remaining):
+            redundancy = max((_similarity(words[i], words[j]) for j in selected), default=0.0)
+            if redundancy >= duplicate_similarity:
+                remaining.remove(i)
+                selection.duplicates += 1
+                continue
+            score = mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+        if best is None:
+            break
+        remaining.remove(best)
+
+        doc, score = candidates[best]
+        # Одна длинная новость не должна занимать бюджет остальных
+        share = max(budget // (max_docs - len(selected)), MIN_DOC_TOKENS)
+        text = truncate_to_tokens(doc.page_content, min(max_doc_tokens, share, budget))
+        tokens = estimate_tokens(text)
+        if text != doc.page_content:
+            doc = Document(page_content=text, metadata=doc.metadata)
+        selected.append(best)
+        selection.documents.append((doc, score))
+        selection.tokens += tokens
+        budget -= tokens
+
+    return selection
@@ -1,80 +1,470 @@
 import sqlite3
-from contextlib import closing
+import hashlib
 import logging
+import os
+import re
+import threading
+import uuid
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Iterable, Tuple
+
+from backend.keyword_matcher import stem
+
+# Путь к БД по умолчанию, переопределяется переменной окружения DB_PATH
+DEFAULT_DB_PATH = 'news.db'
+
+# Настройки SQLite: размер страничного кэша (КБ), размер mmap (байт)
+# и время ожидания блокировки (секунды)
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 30))
+
+# Количество записей, записываемых в одной транзакции при пакетной вставке
+INSERT_BATCH_SIZE = 500
+
+# Окно (секунды), в котором новость с тем же текстом считается репостом
+DEFAULT_REPOST_WINDOW = 3 * 24 * 60 * 60
+
+# Шаблоны нормализации текста перед хэшированием
+_URL_PATTERN = re.compile(r'https?://\S+|t\.me/\S+|@\w+')
+_WORD_PATTERN = re.compile(r'\w+')
+
+# Соединения переиспользуются в пределах потока; после fork создается новое
+_local = threading.local()
+
+def get_db_path() -> str:
+    """Возвращает путь к БД с учетом переменной окружения DB_PATH"""
+    return os.getenv('DB_PATH', DEFAULT_DB_PATH)
+
+def _configure_connection(conn: sqlite3.Connection):
+    """Переводит БД в режим WAL и применяет настройки производительности"""
+    # WAL позволяет читателям API не блокироваться на время записи загрузчика
+    conn.execute('PRAGMA journal_mode=WAL')
+    # В режиме WAL NORMAL безопасен при сбоях процесса и не делает fsync на каждый коммит
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Получение соединения с БД
+    
+    Соединение создается один раз на поток и процесс и переиспользуется
+    всеми функциями модуля. При смене DB_PATH или после fork открывается новое.
+    
+    Returns:
+        sqlite3.Connection: Настроенное соединение с БД
+    """
+    db_path = get_db_path()
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        if _local.db_path == db_path:
+            return conn
+        conn.close()
+    
+    conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT)
+    _configure_connection(conn)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    _local.db_path = db_path
+    return conn
+
+def close_connection():
+    """Закрывает соединение текущего потока, если оно открыто"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
 
 def create_table():
-    with closing(sqlite3.connect('news.db')) as conn:
-        with conn:
-            # Создаем основную таблицу если её нет
+    conn = get_connection()
+    with conn:
+        # Создаем основную таблицу если её нет
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tg_ch_name TEXT,
+                timestamp DATETIME,
+                text TEXT,
+                message_link TEXT,
+                ts_epoch INTEGER,
+                text_hash BLOB
+            )
+        ''')
+        
+        # Миграция: нормализованное время публикации в секундах UTC
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(news)')}
+        if 'ts_epoch' not in columns:
+            conn.execute('ALTER TABLE news ADD COLUMN ts_epoch INTEGER')
+            logging.info("Добавлена колонка ts_epoch")
+        
+        # strftime('%s') учитывает смещение часового пояса в строке timestamp
+        backfilled = conn.execute('''
+            UPDATE news
+            SET ts_epoch = CAST(strftime('%s', timestamp) AS INTEGER)
+            WHERE ts_epoch IS NULL
+        ''').rowcount
+        if backfilled:
+            logging.info(f"Заполнено ts_epoch для {backfilled} записей")
+        
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_news_ts_epoch
+            ON news(ts_epoch)
+        ''')
+        
+        # Миграция: хэш нормализованного текста для дедупликации
+        if 'text_hash' not in columns:
+            conn.execute('ALTER TABLE news ADD COLUMN text_hash BLOB')
+            logging.info("Добавлена колонка text_hash")
+        
+        conn.create_function('news_text_hash', 1, text_hash, deterministic=True)
+        backfilled = conn.execute('''
+            UPDATE news
+            SET text_hash = news_text_hash(text)
+            WHERE text_hash IS NULL
+        ''').rowcount
+        if backfilled:
+            logging.info(f"Заполнено text_hash для {backfilled} записей")
+        
+        # Проверяем существование индекса
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*) 
+            FROM sqlite_master 
+            WHERE type='index' AND name='idx_news_hash'
+        ''')
+        
+        if cursor.fetchone()[0] == 0:
+            # Удаляем дубликаты перед созданием уникального индекса
             conn.execute('''
-                CREATE TABLE IF NOT EXISTS news (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    tg_ch_name TEXT,
-                    timestamp DATETIME,
-                    text TEXT,
-                    message_link TEXT
+                DELETE FROM news 
+                WHERE rowid NOT IN (
+                    SELECT MIN(rowid) 
+                    FROM news 
+                    GROUP BY text_hash, ts_epoch
                 )
             ''')
             
-            # Проверяем существование индекса
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT COUNT(*) 
-                FROM sqlite_master 
-                WHERE type='index' AND name='idx_news_unique'
+            # Уникальный индекс фиксированной ширины вместо индекса по полному тексту
+            conn.execute('''
+                CREATE UNIQUE INDEX idx_news_hash 
+                ON news(text_hash, ts_epoch)
             ''')
+            conn.execute('DROP INDEX IF EXISTS idx_news_unique')
+            logging.info("Создан уникальный индекс по хэшу текста и удалены дубликаты")
+        
+        # Репосты одной новости в других каналах ссылаются на каноническую запись
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news_reposts (
+                news_id INTEGER NOT NULL REFERENCES news(id),
+                tg_ch_name TEXT,
+                timestamp DATETIME,
+                message_link TEXT,
+                ts_epoch INTEGER,
+                UNIQUE (news_id, tg_ch_name, ts_epoch)
+            )
+        ''')
+        
+        # Случайный идентификатор экземпляра БД: id записей не сохраняются
+        # при пересоздании файла, поэтому отметки по ним проверяются по нему
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('db_id', ?)", (uuid.uuid4().hex,))
+        
+        # Манифест обработанных файлов выгрузки: размер, mtime и прочитанное смещение
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ingest_manifest (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                offset INTEGER,
+                processed_at DATETIME
+            )
+        ''')
+        
+        # Полнотекстовый индекс по тексту новостей, синхронизируется триггерами
+        fts_exists = conn.execute('''
+            SELECT COUNT(*)
+            FROM sqlite_master
+            WHERE type='table' AND name='news_fts'
+        ''').fetchone()[0]
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS news_fts
+            USING fts5(text, content='news', content_rowid='id', tokenize='unicode61 remove_diacritics 2')
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news BEGIN
+                INSERT INTO news_fts(rowid, text) VALUES (new.id, new.text);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news BEGIN
+                INSERT INTO news_fts(news_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE OF text ON news BEGIN
+                INSERT INTO news_fts(news_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                INSERT INTO news_fts(rowid, text) VALUES (new.id, new.text);
+            END
+        ''')
+        if not fts_exists:
+            # Миграция: индексируем уже сохраненные новости
+            conn.execute("INSERT INTO news_fts(news_fts) VALUES ('rebuild')")
+            logging.info("Создан полнотекстовый индекс news_fts")
+
+def to_epoch(timestamp) -> int:
+    """
+    Преобразует временную метку в секунды UTC
+    
+    Args:
+        timestamp: datetime или строка в ISO формате. Метки без часового пояса
+            считаются локальным временем, как и в datetime.timestamp()
             
-            if cursor.fetchone()[0] == 0:
-                # Удаляем дубликаты перед созданием уникального индекса
-                conn.execute('''
-                    DELETE FROM news 
-                    WHERE rowid NOT IN (
-                        SELECT MIN(rowid) 
-                        FROM news 
-                        GROUP BY timestamp, text
-                    )
-                ''')
-                
-                # Создаем уникальный индекс
-                conn.execute('''
-                    CREATE UNIQUE INDEX idx_news_unique 
-                    ON news(timestamp, text)
-                ''')
-                logging.info("Создан уникальный индекс и удалены дубликаты")
+    Returns:
+        int: Количество секунд с начала эпохи (UTC)
+    """
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return int(timestamp.timestamp())
+
+def normalize_text(text: str) -> str:
+    """Приводит текст к виду для сравнения: нижний регистр, без ссылок, упоминаний и пунктуации"""
+    text = text.lower().replace('ё', 'е')
+    text = _URL_PATTERN.sub(' ', text)
+    return ' '.join(_WORD_PATTERN.findall(text))
+
+def text_hash(text: str) -> bytes:
+    """Возвращает 16-байтовый хэш нормализованного текста"""
+    return hashlib.blake2b(normalize_text(text or '').encode('utf-8'), digest_size=16).digest()
+
+def is_cross_channel_dedup() -> bool:
+    """Включен ли режим связывания репостов между каналами (DEDUP_CROSS_CHANNEL)"""
+    return os.getenv('DEDUP_CROSS_CHANNEL', 'false').lower() in ('1', 'true', 'yes')
+
+def get_repost_window() -> int:
+    """Окно поиска канонической записи для репоста в секундах (DEDUP_REPOST_WINDOW)"""
+    return int(os.getenv('DEDUP_REPOST_WINDOW', DEFAULT_REPOST_WINDOW))
 
 def is_duplicate(timestamp, text):
-    with closing(sqlite3.connect('news.db')) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT COUNT(*) 
-            FROM news 
-            WHERE timestamp = ? AND text = ?
-        ''', (timestamp, text))
-        count = cursor.fetchone()[0]
-        return count > 0
+    cursor = get_connection().execute('''
+        SELECT COUNT(*) 
+        FROM news 
+        WHERE text_hash = ? AND ts_epoch = ?
+    ''', (text_hash(text), to_epoch(timestamp)))
+    count = cursor.fetchone()[0]
+    return count > 0
 
 def insert_news(tg_ch_name, timestamp, text, message_link):
     try:
-        if is_duplicate(timestamp, text):
+        inserted, _ = insert_news_batch([{
+            'tg_ch_name': tg_ch_name,
+            'timestamp': timestamp,
+            'text': text,
+            'message_link': message_link
+        }])
+        if not inserted:
             logging.info(f"Пропуск дубликата сообщения от {timestamp}")
-            return False
-            
-        with closing(sqlite3.connect('news.db')) as conn:
-            with conn:
-                conn.execute('''
-                    INSERT INTO news (tg_ch_name, timestamp, text, message_link)
-                    VALUES (?, ?, ?, ?)
-                ''', (tg_ch_name, timestamp, text, message_link))
-        return True
-    except sqlite3.IntegrityError:
-        logging.info(f"Дубликат сообщения от {timestamp}")
-        return False
+        return inserted > 0
     except Exception as e:
         logging.error(f"Ошибка при добавлении сообщения: {str(e)}")
         raise
 
+def _write_news_batch(conn, rows) -> int:
+    """Записывает пакет строк в одной транзакции, возвращает число добавленных записей"""
+    with conn:
+        # rowcount не учитывает изменения, сделанные триггерами (например, в news_fts)
+        cursor = conn.executemany('''
+            INSERT OR IGNORE INTO news (tg_ch_name, timestamp, text, message_link, ts_epoch, text_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+    return cursor.rowcount
+
+def _write_news_batch_cross_channel(conn, rows, repost_window: int) -> Tuple[int, int]:
+    """
+    Записывает пакет строк, связывая репосты с уже сохраненной новостью
+    
+    Репостом считается только новость, опубликованная не дальше repost_window
+    секунд от канонической записи. Тот же текст за пределами окна (повторяющиеся
+    объявления, шаблонные посты) сохраняется новой записью, чтобы попадать
+    в поиск за свой период.
+    
+    Returns:
+        Tuple[int, int]: Количество добавленных новостей и связанных репостов
+    """
+    inserted = 0
+    linked = 0
+    with conn:
+        for tg_ch_name, timestamp, text, message_link, ts_epoch, hash_value in rows:
+            canonical = conn.execute('''
+                SELECT id, ts_epoch FROM news
+                WHERE text_hash = ? AND ts_epoch BETWEEN ? AND ?
+                ORDER BY ts_epoch, id
+                LIMIT 1
+            ''', (hash_value, ts_epoch - repost_window, ts_epoch + repost_window)).fetchone()
+            
+            if canonical is None:
+                conn.execute('''
+                    INSERT INTO news (tg_ch_name, timestamp, text, message_link, ts_epoch, text_hash)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (tg_ch_name, timestamp, text, message_link, ts_epoch, hash_value))
+                inserted += 1
+            elif canonical[1] != ts_epoch and not conn.execute('''
+                SELECT 1 FROM news WHERE text_hash = ? AND ts_epoch = ?
+            ''', (hash_value, ts_epoch)).fetchone():
+                changes_before = conn.total_changes
+                conn.execute('''
+                    INSERT OR IGNORE INTO news_reposts (news_id, tg_ch_name, timestamp, message_link, ts_epoch)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (canonical[0], tg_ch_name, timestamp, message_link, ts_epoch))
+                linked += conn.total_changes - changes_before
+    return inserted, linked
+
+def insert_news_batch(
+    news_items: Iterable[Dict],
+    batch_size: int = INSERT_BATCH_SIZE,
+    cross_channel: bool = None,
+    repost_window: int = None
+) -> Tuple[int, int]:
+    """
+    Пакетное добавление новостей в БД через одно соединение
+    
+    Дубликаты определяются по хэшу нормализованного текста и времени публикации
+    и отбрасываются уникальным индексом idx_news_hash (INSERT OR IGNORE).
+    В режиме cross_channel новость с уже известным текстом не сохраняется повторно,
+    а записывается в news_reposts как репост канонической записи, опубликованной
+    в пределах repost_window секунд.
+    
+    Args:
+        news_items: Итерируемый набор словарей с ключами
+            tg_ch_name, timestamp, text, message_link
+        batch_size: Количество записей в одной транзакции
+        cross_channel: Связывать ли репосты между каналами.
+            Если None - берется из переменной окружения DEDUP_CROSS_CHANNEL
+        repost_window: Окно связывания репостов в секундах.
+            Если None - берется из переменной окружения DEDUP_REPOST_WINDOW
+        
+    Returns:
+        Tuple[int, int]: Количество добавленных и пропущенных (дубликатов и репостов) записей
+    """
+    if cross_channel is None:
+        cross_channel = is_cross_channel_dedup()
+    if repost_window is None:
+        repost_window = get_repost_window()
+    
+    conn = get_connection()
+    inserted = 0
+    linked = 0
+    total = 0
+    batch = []
+    
+    def flush():
+        nonlocal inserted, linked, total
+        if cross_channel:
+            batch_inserted, batch_linked = _write_news_batch_cross_channel(conn, batch, repost_window)
+            linked += batch_linked
+        else:
+            batch_inserted = _write_news_batch(conn, batch)
+        inserted += batch_inserted
+        total += len(batch)
+    
+    for news in news_items:
+        batch.append((
+            news['tg_ch_name'],
+            news['timestamp'],
+            news['text'],
+            news.get('message_link'),
+            to_epoch(news['timestamp']),
+            text_hash(news['text'])
+        ))
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    
+    if batch:
+        flush()
+    
+    if linked:
+        logging.info(f"Связано {linked} репостов с уже сохраненными новостями")
+    
+    return inserted, total - inserted
+
+def get_ingest_manifest() -> Dict[str, Dict]:
+    """
+    Получение манифеста обработанных файлов выгрузки
+    
+    Returns:
+        Dict[str, Dict]: Словарь путь -> {size, mtime, offset}
+    """
+    cursor = get_connection().execute('''
+        SELECT path, size, mtime, offset
+        FROM ingest_manifest
+    ''')
+    return {
+        row[0]: {'size': row[1], 'mtime': row[2], 'offset': row[3]}
+        for row in cursor.fetchall()
+    }
+
+def save_ingest_manifest(entries: Iterable[Dict]):
+    """
+    Сохраняет состояние обработанных файлов в одной транзакции
+    
+    Args:
+        entries: Записи с ключами path, size, mtime, offset
+    """
+    conn = get_connection()
+    processed_at = datetime.now().isoformat(' ', timespec='seconds')
+    with conn:
+        conn.executemany('''
+            INSERT OR REPLACE INTO ingest_manifest (path, size, mtime, offset, processed_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (entry['path'], entry['size'], entry['mtime'], entry['offset'], processed_at)
+            for entry in entries
+        ])
+
+def replace_ingest_manifest_entries(sources: List[str], entry: Dict = None):
+    """
+    Заменяет записи манифеста для файлов, объединенных в новый файл
+    
+    Args:
+        sources: Пути исходных файлов, записи которых удаляются
+        entry: Запись для нового файла (path, size, mtime, offset) или None,
+            если новый файл еще нужно прочитать
+    """
+    conn = get_connection()
+    with conn:
+        conn.executemany('DELETE FROM ingest_manifest WHERE path = ?', [(path,) for path in sources])
+        if entry is not None:
+            conn.execute('''
+                INSERT OR REPLACE INTO ingest_manifest (path, size, mtime, offset, processed_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (
+                entry['path'], entry['size'], entry['mtime'], entry['offset'],
+                datetime.now().isoformat(' ', timespec='seconds')
+            ))
+
+def clear_ingest_manifest():
+    """Очищает манифест, чтобы следующий цикл перечитал все файлы"""
+    conn = get_connection()
+    with conn:
+        conn.execute('DELETE FROM ingest_manifest')
+
+def _news_row_to_dict(row) -> Dict:
+    """Преобразует строку (id, text, timestamp, tg_ch_name, message_link) в словарь новости"""
+    return {
+        'id': row[0],
+        'text': row[1],
+        'date': datetime.fromisoformat(row[2]),
+        'channel_id': row[3],
+        'message_id': row[4].split('/')[-1] if row[4] else None
+    }
+
 def fetch_latest_news(limit: int = None) -> List[Dict]:
     """
     Получение новостей из БД с метаданными
@@ -86,54 +476,163 @@ def fetch_latest_news(limit: int = None) -> List[Dict]:
     Returns:
         List[Dict]: Список новостей с метаданными
     """
-    with closing(sqlite3.connect('news.db')) as conn:
-        with conn:
-            query = '''
-                SELECT text, timestamp, tg_ch_name, message_link 
-                FROM news
-                ORDER BY timestamp DESC
-            '''
-            
-            if limit:
-                query += ' LIMIT ?'
-                cursor = conn.execute(query, (limit,))
-            else:
-                cursor = conn.execute(query)
-                
-            rows = cursor.fetchall()
-            return [{
-                'text': row[0],
-                'date': datetime.fromisoformat(row[1]),
-                'channel_id': row[2],
-                'message_id': row[3].split('/')[-1] if row[3] else None
-            } for row in rows] 
+    conn = get_connection()
+    query = '''
+        SELECT id, text, timestamp, tg_ch_name, message_link 
+        FROM news
+        ORDER BY ts_epoch DESC
+    '''
+    
+    if limit:
+        query += ' LIMIT ?'
+        cursor = conn.execute(query, (limit,))
+    else:
+        cursor = conn.execute(query)
+        
+    return [_news_row_to_dict(row) for row in cursor.fetchall()]
 
 def fetch_latest_news_after(timestamp: datetime) -> List[Dict]:
     """
     Получение новостей из БД после указанной временной метки
     
     Args:
-        timestamp: Временная метка, после которой нужно получить новости
+        timestamp: Временная метка, после которой нужно получить новости.
+            Метка без часового пояса считается локальным временем
         
     Returns:
         List[Dict]: Список новостей с метаданными
     """
-    # Преобразуем datetime в строку в нужном формате
-    timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S+00:00')
-    
-    with closing(sqlite3.connect('news.db')) as conn:
-        with conn:
-            cursor = conn.execute('''
-                SELECT text, timestamp, tg_ch_name, message_link 
-                FROM news
-                WHERE datetime(timestamp) > datetime(?)
-                ORDER BY timestamp DESC
-            ''', (timestamp_str,))
-            
-            rows = cursor.fetchall()
-            return [{
-                'text': row[0],
-                'date': datetime.fromisoformat(row[1]),
-                'channel_id': row[2],
-                'message_id': row[3].split('/')[-1] if row[3] else None
-            } for row in rows] 
\ No newline at end of file
+    # Поиск по диапазону индекса idx_news_ts_epoch без вычислений над колонкой
+    cursor = get_connection().execute('''
+        SELECT id, text, timestamp, tg_ch_name, message_link 
+        FROM news
+        WHERE ts_epoch > ?
+        ORDER BY ts_epoch DESC
+    ''', (to_epoch(timestamp),))
+    
+    return [_news_row_to_dict(row) for row in cursor.fetchall()]
+
+def fetch_news_by_ids(ids: List[int]) -> List[Dict]:
+    """
+    Получение новостей по списку идентификаторов
+    
+    Args:
+        ids: Идентификаторы записей таблицы news
+        
+    Returns:
+        List[Dict]: Список новостей в порядке id
+    """
+    conn = get_connection()
+    result = []
+    for start in range(0, len(ids), INSERT_BATCH_SIZE):
+        chunk = ids[start:start + INSERT_BATCH_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        cursor = conn.execute(f'''
+            SELECT id, text, timestamp, tg_ch_name, message_link
+            FROM news
+            WHERE id IN ({placeholders})
+        ''', chunk)
+        result.extend(_news_row_to_dict(row) for row in cursor.fetchall())
+    result.sort(key=lambda item: item['id'])
+    return result
+
+def get_db_id() -> str:
+    """
+    Возвращает идентификатор экземпляра БД, созданный в create_table
+    
+    Returns:
+        str: Идентификатор или None, если таблицы еще не созданы
+    """
+    try:
+        row = get_connection().execute("SELECT value FROM meta WHERE name = 'db_id'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def fetch_news_keys(after_id: int = 0) -> List[Tuple[int, str, str]]:
+    """
+    Получение ключей новостей без текста для сверки с векторной БД
+    
+    Args:
+        after_id: Возвращаются только записи с id больше указанного
+        
+    Returns:
+        List[Tuple[int, str, str]]: Кортежи (id, channel_id, message_id) в порядке id
+    """
+    cursor = get_connection().execute('''
+        SELECT id, tg_ch_name, message_link
+        FROM news
+        WHERE id > ?
+        ORDER BY id
+    ''', (after_id,))
+    return [
+        (row[0], row[1], row[2].split('/')[-1] if row[2] else None)
+        for row in cursor.fetchall()
+    ]
+
+
+# Слова короче этой длины не участвуют в полнотекстовом поиске
+FTS_MIN_WORD_LENGTH = 3
+# Служебные и вопросительные слова, не несущие смысла для поиска
+FTS_STOP_WORDS = frozenset({
+    'как', 'какой', 'какая', 'какое', 'какие', 'каких', 'что', 'чем', 'где', 'когда',
+    'почему', 'зачем', 'кто', 'для', 'или', 'это', 'эти', 'этот', 'при', 'про', 'над',
+    'под', 'без', 'между', 'после', 'перед', 'есть', 'был', 'была', 'были', 'быть',
+    'все', 'всё', 'его', 'она', 'они', 'так', 'уже', 'еще', 'ещё', 'только'
+})
+
+def is_fts_term(word: str) -> bool:
+    """Проверяет, участвует ли слово (в нижнем регистре) в полнотекстовом поиске"""
+    return len(word) >= FTS_MIN_WORD_LENGTH and word not in FTS_STOP_WORDS
+
+def build_fts_query(text: str) -> str:
+    """
+    Строит запрос FTS5 из текста вопроса
+    
+    Каждое слово сокращается до основы и ищется как префикс, слова
+    объединяются через OR, а ранжирование оставляется BM25.
+    
+    Args:
+        text: Текст вопроса
+        
+    Returns:
+        str: Запрос для MATCH или пустая строка, если значимых слов нет
+    """
+    terms = dict.fromkeys(
+        stem(word) for word in _WORD_PATTERN.findall(text.lower()) if is_fts_term(word)
+    )
+    return ' OR '.join(f'"{term}"*' for term in terms)
+
+def search_news_fts(query: str, start_date: datetime = None, end_date: datetime = None, limit: int = 20) -> List[Dict]:
+    """
+    Полнотекстовый поиск новостей с ранжированием BM25
+    
+    Args:
+        query: Текст вопроса
+        start_date: Начало диапазона дат (включительно)
+        end_date: Конец диапазона дат (включительно)
+        limit: Максимальное количество результатов
+        
+    Returns:
+        List[Dict]: Новости с метаданными и оценкой score (BM25, меньше - лучше),
+            от наиболее релевантной
+    """
+    fts_query = build_fts_query(query)
+    if not fts_query:
+        return []
+    
+    cursor = get_connection().execute('''
+        SELECT n.id, n.text, n.timestamp, n.tg_ch_name, n.message_link, bm25(news_fts) AS score
+        FROM news_fts
+        JOIN news n ON n.id = news_fts.rowid
+        WHERE news_fts MATCH ?
+          AND n.ts_epoch BETWEEN ? AND ?
+        ORDER BY score
+        LIMIT ?
+    ''', (
+        fts_query,
+        to_epoch(start_date) if start_date else -2 ** 63,
+        to_epoch(end_date) if end_date else 2 ** 63 - 1,
+        limit
+    ))
+    return [{**_news_row_to_dict(row), 'score': row[5]} for row in cursor.fetchall()]
@@ -1,61 +1,285 @@
-from telethon import TelegramClient, sync
-from telethon.tl.types import Channel
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
 import asyncio
+import gzip
+import json
+import logging
 import os
+import re
 from datetime import datetime
+from typing import Dict
 import argparse
 
-async def download_channel_content(api_id, api_hash, channel_username, limit=100, output_dir=None):
+logger = logging.getLogger(__name__)
+
+# Максимальное число каналов, загружаемых одновременно
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', 3))
+# Количество повторов при ошибках и ограничениях Telegram
+DOWNLOAD_MAX_RETRIES = int(os.getenv('DOWNLOAD_MAX_RETRIES', 3))
+# Максимальное ожидание FloodWait (секунды), после которого канал пропускается до следующего цикла
+DOWNLOAD_MAX_FLOOD_WAIT = int(os.getenv('DOWNLOAD_MAX_FLOOD_WAIT', 300))
+# Базовая задержка экспоненциального повтора при прочих ошибках (секунды)
+DOWNLOAD_RETRY_DELAY = float(os.getenv('DOWNLOAD_RETRY_DELAY', 2))
+
+# Формат файлов выгрузки: txt (текстовые блоки [дата] текст) или jsonl (одна запись JSON на строку)
+DOWNLOAD_FORMAT = os.getenv('DOWNLOAD_FORMAT', 'txt')
+
+# Файл с идентификатором последнего загруженного сообщения в папке канала
+STATE_FILE_NAME = 'last_message_id'
+
+_MESSAGE_LINK_ID = re.compile(r'^\[MESSAGE_LINK:.*/(\d+)\]$')
+
+def load_last_message_id(directory: str) -> int:
     """
-    Download content from a Telegram channel
-    
+    Возвращает идентификатор последнего загруженного сообщения канала
+
+    Если отметки еще нет, она восстанавливается по ссылкам в уже
+    загруженных файлах, чтобы не скачивать канал заново после обновления.
+    """
+    state_file = os.path.join(directory, STATE_FILE_NAME)
+    if os.path.exists(state_file):
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+
+    last_message_id = 0
+    for name in os.listdir(directory):
+        if name.startswith('messages') and name.endswith('.txt'):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                for line in f:
+                    match = _MESSAGE_LINK_ID.match(line.strip())
+                    if match:
+                        last_message_id = max(last_message_id, int(match.group(1)))
+        elif name.startswith(('messages', 'segment_')) and name.endswith(('.jsonl', '.jsonl.gz')):
+            opener = gzip.open if name.endswith('.gz') else open
+            with opener(os.path.join(directory, name), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line) if line.strip() else {}
+                    if record.get('id'):
+                        last_message_id = max(last_message_id, record['id'])
+    return last_message_id
+
+def format_message(msg, channel_username: str, output_format: str) -> str:
+    """
+    Формирует запись сообщения для файла выгрузки
+
     Parameters:
-    api_id (int): Telegram API ID
-    api_hash (str): Telegram API hash
+    msg: Telethon message
     channel_username (str): Channel username without '@'
-    limit (int): Maximum number of messages to download
-    output_dir (str): Directory to save downloaded content
+    output_format (str): 'txt' или 'jsonl'
     """
-    # Create client
-    client = TelegramClient('session_name', api_id, api_hash)
-    
-    try:
-        # Start client
-        await client.start()
-        
-        # Get channel entity
-        channel = await client.get_entity(channel_username)
-        
+    # Формируем ссылку на сообщение
+    message_link = f"https://t.me/{channel_username}/{msg.id}"
+    if output_format == 'jsonl':
+        return json.dumps({
+            'id': msg.id,
+            'date': msg.date.isoformat(),
+            'channel': channel_username,
+            'link': message_link,
+            'views': getattr(msg, 'views', None),
+            'edit_date': msg.edit_date.isoformat() if getattr(msg, 'edit_date', None) else None,
+            'text': msg.text
+        }, ensure_ascii=False) + "\n"
+    return f"[{msg.date}] {msg.text}\n[MESSAGE_LINK:{message_link}]\n\n"
+
+def save_last_message_id(directory: str, message_id: int):
+    """Атомарно сохраняет идентификатор последнего загруженного сообщения"""
+    state_file = os.path.join(directory, STATE_FILE_NAME)
+    with open(state_file + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(str(message_id))
+    os.replace(state_file + '.tmp', state_file)
+
+class ChannelDownloader:
+    """
+    Загрузчик сообщений из Telegram каналов через одно долгоживущее соединение
+
+    Клиент подключается один раз, найденные каналы кэшируются, а каналы
+    загружаются параллельно с ограничением DOWNLOAD_CONCURRENCY. Вместо
+    TelegramClient можно передать любой объект с асинхронными методами
+    start, get_entity, iter_messages и disconnect (например, tests/fake_telegram.py).
+    """
+
+    def __init__(
+        self,
+        api_id: int = None,
+        api_hash: str = None,
+        session_name: str = 'session_name',
+        concurrency: int = DOWNLOAD_CONCURRENCY,
+        max_retries: int = DOWNLOAD_MAX_RETRIES,
+        max_flood_wait: int = DOWNLOAD_MAX_FLOOD_WAIT,
+        retry_delay: float = DOWNLOAD_RETRY_DELAY,
+        output_format: str = DOWNLOAD_FORMAT,
+        client=None
+    ):
+        """
+        Args:
+            api_id: Telegram API ID
+            api_hash: Telegram API hash
+            session_name: Имя файла сессии Telethon
+            concurrency: Максимальное число одновременно загружаемых каналов
+            max_retries: Количество повторов при ошибках загрузки канала
+            max_flood_wait: Максимальное допустимое ожидание FloodWait в секундах
+            retry_delay: Базовая задержка экспоненциального повтора в секундах
+            output_format: Формат файлов выгрузки: txt или jsonl
+            client: Готовый клиент вместо TelegramClient
+        """
+        self.client = client or TelegramClient(session_name, api_id, api_hash)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.max_flood_wait = max_flood_wait
+        self.retry_delay = retry_delay
+        if output_format not in ('txt', 'jsonl'):
+            raise ValueError(f"Неизвестный формат выгрузки: {output_format}")
+        self.output_format = output_format
+        self._entities = {}
+        self._started = False
+
+    async def start(self):
+        """Подключает клиента, если он еще не подключен"""
+        if not self._started:
+            await self.client.start()
+            self._started = True
+
+    async def stop(self):
+        """Отключает клиента"""
+        if self._started:
+            await self.client.disconnect()
+            self._started = False
+
+    async def get_entity(self, channel_username: str):
+        """Возвращает сущность канала, запрашивая ее у Telegram только один раз"""
+        if channel_username not in self._entities:
+            self._entities[channel_username] = await self.client.get_entity(channel_username)
+        return self._entities[channel_username]
+
+    async def download_channel(self, channel_username: str, limit: int = 100, output_dir: str = None) -> str:
+        """
+        Download new content from a Telegram channel
+
+        Only messages newer than the last downloaded one are fetched, with
+        automatic paging. The first download of a channel takes the latest
+        `limit` messages.
+
+        Parameters:
+        channel_username (str): Channel username without '@'
+        limit (int): Number of messages to download when the channel has no saved state
+        output_dir (str): Directory to save downloaded content
+
+        Returns:
+        str: Path to the written messages file or None if there were no new messages
+        """
+        await self.start()
+        channel = await self.get_entity(channel_username)
+
         # Use provided output directory or create default one
         if output_dir:
             directory = output_dir
         else:
             directory = f"telegram_downloads_{channel_username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
+
         os.makedirs(directory, exist_ok=True)
-        
-        # Создаем новый файл с временной меткой
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        messages_file = os.path.join(directory, f"messages_{timestamp}.txt")
-        
-        # Download messages
-        messages = await client.get_messages(channel, limit=limit)
-        
-        # Process messages
-        with open(messages_file, "w", encoding="utf-8") as f:
-            for msg in messages:
-                if msg.text:
-                    # Формируем ссылку на сообщение
-                    message_link = f"https://t.me/{channel_username}/{msg.id}"
-                    f.write(f"[{msg.date}] {msg.text}\n[MESSAGE_LINK:{message_link}]\n\n")
-                
-        print(f"Downloaded content saved to {messages_file}")
-        
+
+        last_message_id = load_last_message_id(directory)
+        if last_message_id:
+            # Все сообщения новее последнего загруженного, от старых к новым
+            messages = self.client.iter_messages(channel, min_id=last_message_id, reverse=True)
+        else:
+            messages = self.client.iter_messages(channel, limit=limit)
+
+        # Создаем новый файл с временной меткой; микросекунды не дают двум
+        # загрузкам в одну секунду перезаписать файл друг друга
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        messages_file = os.path.join(directory, f"messages_{timestamp}.{self.output_format}")
+        partial_file = messages_file + '.part'
+
+        # Download and process messages page by page
+        max_message_id = last_message_id
+        try:
+            with open(partial_file, "w", encoding="utf-8") as f:
+                async for msg in messages:
+                    max_message_id = max(max_message_id, msg.id)
+                    if msg.text:
+                        f.write(format_message(msg, channel_username, self.output_format))
+        except BaseException:
+            # Отметка не сдвигается, при повторе сообщения будут загружены заново
+            os.remove(partial_file)
+            raise
+
+        if max_message_id == last_message_id:
+            os.remove(partial_file)
+            return None
+
+        # Файл становится виден парсеру только целиком, затем сдвигается отметка
+        os.replace(partial_file, messages_file)
+        save_last_message_id(directory, max_message_id)
+        return messages_file
+
+    async def _download_with_retries(self, semaphore: asyncio.Semaphore, channel_username: str, limit: int, output_dir: str) -> str:
+        """Загружает канал с повторами: FloodWait выжидается, прочие ошибки повторяются с растущей задержкой"""
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await self.download_channel(channel_username, limit, output_dir)
+                except FloodWaitError as e:
+                    if e.seconds > self.max_flood_wait or attempt == self.max_retries:
+                        raise
+                    logger.warning(f"FloodWait для канала {channel_username}: ожидание {e.seconds} с")
+                    await asyncio.sleep(e.seconds)
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.retry_delay * 2 ** attempt
+                    logger.warning(f"Ошибка загрузки канала {channel_username}: {e}. Повтор через {delay:.0f} с")
+                    await asyncio.sleep(delay)
+
+    async def download_all(self, channels: Dict[str, Dict]) -> Dict[str, object]:
+        """
+        Параллельно загружает сообщения из нескольких каналов
+
+        Args:
+            channels: Словарь канал -> {'limit': int, 'output_dir': str}
+
+        Returns:
+            Dict[str, object]: Для каждого канала путь к файлу или исключение,
+                если загрузка не удалась
+        """
+        await self.start()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        names = list(channels)
+        results = await asyncio.gather(
+            *(
+                self._download_with_retries(semaphore, name, channels[name]['limit'], channels[name].get('output_dir'))
+                for name in names
+            ),
+            return_exceptions=True
+        )
+        return dict(zip(names, results))
+
+async def download_channel_content(api_id, api_hash, channel_username, limit=100, output_dir=None, output_format=DOWNLOAD_FORMAT):
+    """
+    Download content from a Telegram channel
+
+    Parameters:
+    api_id (int): Telegram API ID
+    api_hash (str): Telegram API hash
+    channel_username (str): Channel username without '@'
+    limit (int): Number of messages to download when the channel has no saved state
+    output_dir (str): Directory to save downloaded content
+    output_format (str): 'txt' or 'jsonl'
+    """
+    downloader = ChannelDownloader(api_id, api_hash, output_format=output_format)
+
+    try:
+        messages_file = await downloader.download_channel(channel_username, limit, output_dir)
+        if messages_file:
+            print(f"Downloaded content saved to {messages_file}")
+        else:
+            print("No new messages")
+
     except Exception as e:
         print(f"Error occurred: {e}")
-        
+
     finally:
-        await client.disconnect()
+        await downloader.stop()
 
 async def main():
     # Set up argument parser
@@ -63,18 +287,20 @@ async def main():
     parser.add_argument('--api-id', required=True, help='Telegram API ID')
     parser.add_argument('--api-hash', required=True, help='Telegram API Hash')
     parser.add_argument('--channel', required=True, help='Имя канала')
-    parser.add_argument('--limit', type=int, default=10, help='Лимит сообщений')
+    parser.add_argument('--limit', type=int, default=10, help='Лимит сообщений при первой загрузке канала')
     parser.add_argument('--output-dir', help='Директория для сохранения сообщений')
-    
+    parser.add_argument('--format', choices=['txt', 'jsonl'], default=DOWNLOAD_FORMAT, help='Формат файлов выгрузки')
+
     args = parser.parse_args()
     api_id = int(args.api_id)
-    
+
     await download_channel_content(
-        api_id, 
-        args.api_hash, 
-        args.channel, 
+        api_id,
+        args.api_hash,
+        args.channel,
         args.limit,
-        args.output_dir
+        args.output_dir,
+        args.format
     )
 
 if __name__ == "__main__":
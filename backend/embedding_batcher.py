@@ -0,0 +1,94 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Объединять ли одновременные запросы на эмбеддинг вопроса в один батч
+QUERY_BATCHING_ENABLED = os.getenv('QUERY_BATCHING', 'true').lower() in ('1', 'true', 'yes')
+# Максимальный размер батча вопросов
+QUERY_BATCH_MAX_SIZE = int(os.getenv('QUERY_BATCH_MAX_SIZE', 32))
+# Сколько первый вопрос батча ждет остальные (миллисекунды)
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv('QUERY_BATCH_MAX_WAIT_MS', 5))
+
+class QueryEmbeddingBatcher(Embeddings):
+    """
+    Объединение одновременных запросов на эмбеддинг вопроса в батчи
+
+    Вопросы, пришедшие в течение max_wait_ms после первого, векторизуются
+    одним вызовом модели в отдельном потоке, и каждый вызывающий поток
+    получает свой вектор. Под нагрузкой это заменяет множество прогонов
+    модели с батчем 1 одним прогоном большого батча. Вопросы кодируются
+    через embed_documents исходной функции, поэтому обертка подходит для
+    симметричных моделей, у которых эмбеддинги вопроса и документа совпадают.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+        max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS
+    ):
+        """
+        Args:
+            embeddings: Исходная функция эмбеддингов
+            max_batch_size: Максимальное количество вопросов в батче
+            max_wait_ms: Максимальное ожидание дополнительных вопросов в миллисекундах
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='query-embedding-batcher', daemon=True)
+                    self._thread.start()
+
+    def _collect(self) -> list:
+        """Ждет первый вопрос и добирает к нему остальные до заполнения батча или истечения ожидания"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Одинаковые вопросы векторизуются один раз
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            logger.debug(f"Батч эмбеддингов вопросов: {len(batch)} запросов, {len(texts)} текстов")
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.database import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Папка кэша эмбеддингов и флаг его использования
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', './embedding_cache')
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE', 'true').lower() in ('1', 'true', 'yes')
+
+# Максимальное число параметров в одном SQL-запросе
+_LOOKUP_CHUNK = 500
+
+class CachedEmbeddings(Embeddings):
+    """
+    Обертка над функцией эмбеддингов с постоянным кэшем на диске
+
+    Векторы хранятся в одном файле float32, который читается через memory map,
+    а индекс "ключ -> номер строки" - в SQLite. Ключ - хэш имени модели и
+    нормализованного текста, поэтому повторная индексация, перезапуски и
+    репосты одного текста не требуют повторного вызова модели.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR):
+        """
+        Args:
+            embeddings: Исходная функция эмбеддингов
+            model_name: Имя модели; векторы разных моделей хранятся раздельно
+            cache_dir: Корневая папка кэша
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.directory = Path(cache_dir) / model_name.replace('/', '__')
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / 'vectors.f32'
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.directory / 'index.db', check_same_thread=False)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS vectors (key BLOB PRIMARY KEY, row INTEGER)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+        self._matrix = None
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str, kind: str) -> bytes:
+        """Ключ кэша: хэш модели, типа текста (документ или запрос) и нормализованного текста"""
+        payload = f"{self.model_name}\0{kind}\0{normalize_text(text)}".encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    def _rows(self) -> int:
+        """Количество векторов в файле"""
+        if self.dim is None or not self.vectors_path.exists():
+            return 0
+        return self.vectors_path.stat().st_size // (self.dim * 4)
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Находит сохраненные векторы для ключей"""
+        rows = {}
+        unique_keys = list(set(keys))
+        for start in range(0, len(unique_keys), _LOOKUP_CHUNK):
+            chunk = unique_keys[start:start + _LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows.update(self._conn.execute(
+                f'SELECT key, row FROM vectors WHERE key IN ({placeholders})', chunk
+            ).fetchall())
+        if not rows:
+            return {}
+
+        total_rows = self._rows()
+        if self._matrix is None or self._matrix.shape[0] < total_rows:
+            # Файл дописан - переоткрываем отображение
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(total_rows, self.dim))
+        return {key: np.asarray(self._matrix[row]) for key, row in rows.items()}
+
+    def _store(self, keys: List[bytes], vectors: List[List[float]]):
+        """Дописывает векторы в файл и регистрирует их в индексе"""
+        array = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = array.shape[1]
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (str(self.dim),))
+
+        first_row = self._rows()
+        with open(self.vectors_path, 'ab') as f:
+            # Неполная строка, оставшаяся после прерванной записи, отбрасывается,
+            # иначе все новые векторы окажутся смещены относительно индекса
+            f.truncate(first_row * self.dim * 4)
+            f.write(array.tobytes())
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO vectors (key, row) VALUES (?, ?)',
+                [(key, first_row + i) for i, key in enumerate(keys)]
+            )
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        """Возвращает векторы из кэша, вычисляя моделью только отсутствующие"""
+        keys = [self._key(text, kind) for text in texts]
+        with self._lock:
+            found = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        # Запросы векторизуются по одному, поэтому для них статистика пишется только в debug
+        logger.log(
+            logging.INFO if kind == 'document' else logging.DEBUG,
+            f"Кэш эмбеддингов: {len(texts) - len(missing)} из {len(texts)} найдено, "
+            f"всего попаданий {self.hits} из {self.hits + self.misses} "
+            f"({self.hits / max(self.hits + self.misses, 1):.0%})"
+        )
+
+        if missing:
+            missing_texts = list(missing.values())
+            if kind == 'query':
+                computed = [self.embeddings.embed_query(text) for text in missing_texts]
+            else:
+                computed = self.embeddings.embed_documents(missing_texts)
+            with self._lock:
+                self._store(list(missing), computed)
+            found.update(zip(missing, (np.asarray(vector, dtype=np.float32) for vector in computed)))
+
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, 'document')
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], 'query')[0]
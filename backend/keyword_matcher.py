@@ -0,0 +1,134 @@
+import os
+import re
+import logging
+from typing import Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Ключевые слова по умолчанию, если не заданы NEWS_KEYWORDS или NEWS_KEYWORDS_FILE
+DEFAULT_KEYWORDS = [
+    'самокат', 'мобильности',
+    'электросамокат', 'кикшеринг'
+]
+
+# Окончания русских слов, отбрасываемые при построении основы (от длинных к коротким).
+# Только словоизменительные: суффиксы вроде -ость не отбрасываются, иначе
+# 'мобильности' превращается в префикс 'мобильн' и совпадает с 'мобильный интернет'
+RUSSIAN_ENDINGS = sorted([
+    'ыми', 'ими', 'ого', 'его', 'ому', 'ему', 'ами', 'ями',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю',
+    'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ом', 'ем',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь'
+], key=len, reverse=True)
+
+# Минимальная длина основы, чтобы короткие слова не превращались в слишком общие префиксы
+MIN_STEM_LENGTH = 4
+
+_CYRILLIC_WORD = re.compile(r'^[а-яё]+$')
+
+def load_keywords() -> List[str]:
+    """
+    Загружает список ключевых слов из окружения
+
+    NEWS_KEYWORDS_FILE - путь к файлу с одним ключевым словом или фразой на строку
+    (строки, начинающиеся с #, пропускаются). NEWS_KEYWORDS - список через запятую.
+
+    Returns:
+        List[str]: Ключевые слова в нижнем регистре
+    """
+    keywords_file = os.getenv('NEWS_KEYWORDS_FILE')
+    if keywords_file:
+        with open(keywords_file, 'r', encoding='utf-8') as f:
+            keywords = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    elif os.getenv('NEWS_KEYWORDS'):
+        keywords = [keyword.strip() for keyword in os.getenv('NEWS_KEYWORDS').split(',') if keyword.strip()]
+    else:
+        keywords = DEFAULT_KEYWORDS
+    return [keyword.lower() for keyword in keywords]
+
+def stem(word: str) -> str:
+    """Отбрасывает окончание русского слова, оставляя основу не короче MIN_STEM_LENGTH"""
+    word = word.lower()
+    if not _CYRILLIC_WORD.match(word):
+        return word
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+def keyword_prefix(keyword: str) -> str:
+    """
+    Превращает ключевое слово в префикс для поиска
+
+    Слово с '*' на конце используется как префикс без изменений,
+    в остальных случаях каждое слово фразы сокращается до основы.
+    """
+    if keyword.endswith('*'):
+        return keyword[:-1]
+    return ' '.join(stem(word) for word in keyword.split())
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Строит регулярное выражение по префиксному дереву слов, общие префиксы проверяются один раз"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        if '' in node:
+            # Достаточно совпадения более короткого префикса
+            return ''
+        branches = []
+        for char in sorted(node):
+            if char == ' ':
+                # Пробел во фразе: окончание предыдущего слова и любой разделитель
+                branches.append(r'\w*\W+' + build(node[char]))
+            elif char in 'её':
+                branches.append('[её]' + build(node[char]))
+            else:
+                branches.append(re.escape(char) + build(node[char]))
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    return build(trie)
+
+class KeywordMatcher:
+    """Поиск ключевых слов одним скомпилированным регулярным выражением"""
+
+    def __init__(self, keywords: List[str] = None):
+        """
+        Args:
+            keywords: Ключевые слова или фразы. Если None - загружаются через load_keywords
+        """
+        self.keywords = keywords if keywords is not None else load_keywords()
+        # ё и е в дереве совпадают с обеими буквами, поэтому варианты написания объединяются
+        prefixes = {keyword_prefix(keyword.lower()).replace('ё', 'е') for keyword in self.keywords}
+        prefixes.discard('')
+        # Пустой список не совпадает ни с чем. Текст приводится к нижнему регистру
+        # перед поиском: это быстрее, чем re.IGNORECASE для кириллицы
+        self.pattern = re.compile(_trie_pattern(prefixes) if prefixes else r'(?!)')
+        logger.info(f"Загружено {len(self.keywords)} ключевых слов")
+        logger.debug(f"Префиксы поиска: {sorted(prefixes)}")
+
+    def matches(self, text: str) -> bool:
+        """Проверяет наличие хотя бы одного ключевого слова в тексте"""
+        return self.pattern.search(text.lower()) is not None
+
+    def filter(self, messages: Iterable[Dict], key: str = 'text') -> Iterator[Dict]:
+        """
+        Отбирает сообщения, в тексте которых есть ключевые слова
+
+        Args:
+            messages: Итератор сообщений
+            key: Ключ словаря с текстом сообщения
+
+        Yields:
+            Dict: Сообщения с совпадением
+        """
+        search = self.pattern.search
+        for message in messages:
+            if message[key] and search(message[key].lower()) is not None:
+                yield message
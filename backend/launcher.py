@@ -1,11 +1,16 @@
-import subprocess
 import asyncio
 import os
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
+from backend.database import create_table
+from backend.news_fetcher import ingest_news, FETCHER_WORKERS
+from backend.download_channels import ChannelDownloader
+from backend.compaction import compact_data_dir
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -45,13 +50,13 @@ TELEGRAM_API_ID = os.getenv('TELEGRAM_API_ID')
 TELEGRAM_API_HASH = os.getenv('TELEGRAM_API_HASH')
 TELEGRAM_CHANNELS = os.getenv('TELEGRAM_CHANNELS')
 DOWNLOAD_INTERVAL = int(os.getenv('DOWNLOAD_INTERVAL_MINUTES', 1))
-MESSAGE_LIMIT = int(os.getenv('MESSAGE_LIMIT', 10))
+# Глубина первой загрузки канала; дальше загружаются только новые сообщения
+INITIAL_MESSAGE_LIMIT = int(os.getenv('INITIAL_MESSAGE_LIMIT', 10000))
 TELEGRAM_DATA_DIR = os.getenv('TELEGRAM_DATA_DIR', 'telegram_channels_data')
 
-def is_new_channel(channel_name):
-    """Проверяет, является ли канал новым (отсутствует папка канала)"""
-    channel_dir = Path(TELEGRAM_DATA_DIR) / channel_name
-    return not channel_dir.exists()
+# Весь разбор и запись в БД выполняются в одном потоке: соединение с SQLite,
+# скомпилированные ключевые слова и манифест переиспользуются между циклами
+ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest')
 
 def ensure_channel_directory(channel_name):
     """Создает директорию для канала, если она не существует"""
@@ -59,88 +64,76 @@ def ensure_channel_directory(channel_name):
     channel_dir.mkdir(parents=True, exist_ok=True)
     return channel_dir
 
-async def run_downloader():
-    # Флаг первого запуска
-    first_run = True
+async def download_channels(downloader, channels):
+    """Загружает сообщения всех каналов через общий клиент и логирует результат по каждому"""
+    tasks = {}
+    for channel in channels:
+        channel_dir = ensure_channel_directory(channel)
+        tasks[channel] = {'limit': INITIAL_MESSAGE_LIMIT, 'output_dir': str(channel_dir)}
     
-    while True:
-        try:
-            channels = TELEGRAM_CHANNELS.split(',') if TELEGRAM_CHANNELS else []
-            if not channels:
-                logger.error("Не указаны каналы в TELEGRAM_CHANNELS")
-                await asyncio.sleep(DOWNLOAD_INTERVAL * 60)
-                continue
-
-            logger.info(f"Начало цикла загрузки для каналов: {channels}")
-            start_time = datetime.now()
-            
-            # Загрузка сообщений из Telegram
-            for channel in channels:
-                try:
-                    message_limit = 10000 if is_new_channel(channel) else MESSAGE_LIMIT
-                    channel_dir = ensure_channel_directory(channel)
-                    
-                    # Запуск скрипта загрузки
-                    logger.info(f"Запуск download_channels.py для {channel} с лимитом {message_limit}")
-                    download_process = subprocess.Popen(
-                        [
-                            "python", "backend/download_channels.py",
-                            "--api-id", TELEGRAM_API_ID,
-                            "--api-hash", TELEGRAM_API_HASH,
-                            "--channel", channel,
-                            "--limit", str(message_limit),
-                            "--output-dir", str(channel_dir)
-                        ],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE
-                    )
-                    
-                    stdout, stderr = download_process.communicate()
-                    
-                    if download_process.returncode == 0:
-                        logger.info(f"Загрузка сообщений для канала {channel} успешно завершена")
-                        if stdout:
-                            logger.debug(f"Вывод download_channels.py: {stdout.decode('utf-8')}")
-                    else:
-                        logger.error(
-                            f"Ошибка при загрузке сообщений для канала {channel}. "
-                            f"Код: {download_process.returncode}\n"
-                            f"Ошибка: {stderr.decode('utf-8')}"
-                        )
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке канала {channel}: {str(e)}")
-                    continue
-            
-            # Запуск парсера с флагом полной загрузки при первом запуске
-            logger.info("Запуск news_fetcher.py")
-            cmd = ["python", "-m", "backend.news_fetcher"]
-            if first_run:
-                cmd.append("--full-load")
-
-            parser_process = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True
-            )
+    results = await downloader.download_all(tasks)
+    
+    for channel, result in results.items():
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка при загрузке сообщений для канала {channel}: {str(result)}")
+        elif result:
+            logger.info(f"Загрузка сообщений для канала {channel} успешно завершена: {result}")
+        else:
+            logger.info(f"Новых сообщений в канале {channel} нет")
 
-            # Всегда логируем вывод
-            if parser_process.stdout:
-                logger.info(f"STDOUT news_fetcher.py:\n{parser_process.stdout}")
-            if parser_process.stderr:
-                logger.info(f"STDERR news_fetcher.py:\n{parser_process.stderr}")
+async def run_cycle(loop, downloader):
+    """Один цикл: загрузка всех каналов, затем разбор и запись в БД"""
+    try:
+        channels = TELEGRAM_CHANNELS.split(',') if TELEGRAM_CHANNELS else []
+        if not channels:
+            logger.error("Не указаны каналы в TELEGRAM_CHANNELS")
+            return
 
-            if parser_process.returncode == 0:
-                execution_time = datetime.now() - start_time
-                logger.info(f"Цикл успешно завершен. Время выполнения: {execution_time}")
-                first_run = False
-            else:
-                logger.error(f"Ошибка при обработке сообщений. Код возврата: {parser_process.returncode}")
-            
-        except Exception as e:
-            logger.exception(f"Критическая ошибка в цикле загрузки: {str(e)}")
+        logger.info(f"Начало цикла загрузки для каналов: {channels}")
+        start_time = datetime.now()
+        download_start = time.perf_counter()
+        
+        # Загрузка сообщений из Telegram: каналы загружаются параллельно
+        await download_channels(downloader, channels)
+        
+        download_seconds = time.perf_counter() - download_start
+        
+        # Разбор и сохранение новостей в том же процессе, в отдельном потоке,
+        # чтобы не блокировать цикл событий
+        stats = await loop.run_in_executor(ingest_executor, ingest_news, False, FETCHER_WORKERS)
         
-        logger.info(f"Ожидание {DOWNLOAD_INTERVAL} минут до следующего запуска")
-        await asyncio.sleep(DOWNLOAD_INTERVAL * 60)
+        # Уплотнение уже прочитанных файлов в дневные сегменты
+        compaction_start = time.perf_counter()
+        await loop.run_in_executor(ingest_executor, compact_data_dir, TELEGRAM_DATA_DIR, channels)
+        compaction_seconds = time.perf_counter() - compaction_start
+        
+        execution_time = datetime.now() - start_time
+        logger.info(
+            f"Цикл успешно завершен. Время выполнения: {execution_time}. "
+            f"Этапы: загрузка {download_seconds:.2f} с, "
+            f"разбор {stats['parse_seconds']:.2f} с, "
+            f"запись в БД {stats['store_seconds']:.2f} с, "
+            f"уплотнение {compaction_seconds:.2f} с; "
+            f"добавлено {stats['inserted']}, пропущено {stats['skipped']}"
+        )
+        
+    except Exception as e:
+        logger.exception(f"Критическая ошибка в цикле загрузки: {str(e)}")
+
+async def run_downloader():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(ingest_executor, create_table)
+    
+    # Одно соединение с Telegram на все время работы сервиса
+    downloader = ChannelDownloader(int(TELEGRAM_API_ID), TELEGRAM_API_HASH)
+    
+    try:
+        while True:
+            await run_cycle(loop, downloader)
+            logger.info(f"Ожидание {DOWNLOAD_INTERVAL} минут до следующего запуска")
+            await asyncio.sleep(DOWNLOAD_INTERVAL * 60)
+    finally:
+        await downloader.stop()
 
 if __name__ == "__main__":
     logger.info("Запуск сервиса загрузки Telegram сообщений")
@@ -1,10 +1,15 @@
 import os
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Tuple
 from dotenv import load_dotenv
 from langchain.chat_models.gigachat import GigaChat
 from langchain.schema import HumanMessage, SystemMessage
-from backend.database import fetch_latest_news
-from backend.news_searcher import NewsSearcher
+from backend.news_searcher import NewsSearcher, news_doc_id
+from backend.answer_cache import AnswerCache
+from backend.context_builder import build_context, CONTEXT_CANDIDATES
+from backend.news_indexer import NewsIndexer
 from datetime import datetime, timedelta
 
 # Настройка логирования
@@ -13,6 +18,9 @@ logger = logging.getLogger(__name__)
 # Загрузка переменных окружения
 load_dotenv()
 
+# Количество потоков для векторизации вопросов и поиска в асинхронном API
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', 4))
+
 class LLMInference:
     def __init__(self):
         self.api_key = os.getenv('GIGACHAT_API_KEY')
@@ -29,19 +37,97 @@ class LLMInference:
         
         # Инициализируем векторную БД
         self.news_searcher = NewsSearcher()
+        self.search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='search')
 
         print('statistics: ', self.news_searcher.get_collection_stats())
         
-        # Загружаем начальные данные из SQLite
-        self._initialize_vector_db()
+        # Кэш ответов; ответы по диапазону дат с новыми документами удаляются
+        self.answer_cache = AnswerCache()
+        self.news_searcher.on_news_added.append(self.answer_cache.invalidate)
 
-        print('statistics: ', self.news_searcher.get_collection_stats())
+        # Новости из SQLite дополняются в фоне, поиск доступен сразу
+        self.indexer = NewsIndexer(self.news_searcher)
+        self.indexer.start()
+
+    def rebuild_vector_db(self):
+        """
+        Запрашивает полную переиндексацию векторной БД (административное действие)
+
+        Переиндексация выполняется в потоке фоновой индексации. Пока она идет,
+        коллекция заполняется заново и поиск может находить не все новости.
+        """
+        self.indexer.request_rebuild()
+
+    def _retrieve(self, prompt: str, start_date: datetime, end_date: datetime) -> Tuple[List[float], List[tuple], Tuple]:
+        """
+        Векторизует вопрос и ищет релевантные новости
+        
+        Returns:
+            Tuple: Эмбеддинг вопроса, найденные документы и ключ кэша ответов
+        """
+        # Короткие запросы из ключевых слов ищутся без вызова модели эмбеддингов
+        query_embedding = None
+        if self.news_searcher.needs_embedding(prompt):
+            query_embedding = self.news_searcher.embed_query(prompt)
+        candidates = self.news_searcher.search_news(
+            query=prompt,
+            start_date=start_date,
+            end_date=end_date,
+            k=CONTEXT_CANDIDATES,
+            embedding=query_embedding
+        )
 
-    def _initialize_vector_db(self):
-        """Инициализация векторной БД данными из SQLite"""
-        news_items = fetch_latest_news()
-        if news_items:
-            self.news_searcher.add_news(news_items)
+        # Из кандидатов отбираются разные новости в пределах бюджета токенов
+        selection = build_context(candidates)
+        relevant_docs = selection.documents
+        logger.info(
+            f"Контекст: {len(relevant_docs)} из {selection.candidates} кандидатов, "
+            f"дубликатов {selection.duplicates}, ~{selection.tokens} токенов "
+            f"(сэкономлено ~{max(selection.baseline_tokens - selection.tokens, 0)})"
+        )
+        print('relevant_docs', relevant_docs)
+
+        # Тот же вопрос по тем же документам не отправляется в модель повторно
+        cache_key = (
+            start_date.timestamp() if start_date else float('-inf'),
+            end_date.timestamp() if end_date else float('inf'),
+            [news_doc_id(doc.metadata['channel_id'], doc.metadata['message_id']) for doc, _ in relevant_docs]
+        )
+        return query_embedding, relevant_docs, cache_key
+
+    def _build_messages(self, prompt: str, relevant_docs: List[tuple]) -> List:
+        """Формирует сообщения для модели из вопроса и найденных новостей"""
+        # Формируем контекст из найденных документов
+        context_parts = []
+        for doc, score in relevant_docs:
+            context_parts.append(f"Новость:\n{doc.page_content}")
+        
+        context = "\n\n".join(context_parts)
+        
+        if not context:
+            context = "К сожалению, релевантных новостей не найдено."
+        
+        full_prompt = (
+            "На основе следующих новостей ответь на вопрос."
+            "Если в новостях нет релевантной информации, так и скажи.\n\n"
+            f"Новости:\n{context}\n\n"
+            f"Вопрос: {prompt}"
+        )
+        print('full_prompt', full_prompt)
+
+        return [
+            SystemMessage(content=(
+                """
+                Вы являетесь экспертом в области саммари новостей о самокатах.
+                Ваша задача — предоставлять точные сводки и отвечать на специфические вопросы, такие как 
+                'Какие новые технологии в области самокатов появились за последний год?' или 
+                'Какие новые законодательные требования для самокатов появились за последний год?'. 
+                Вы не должны придумывать информацию; все ответы должны основываться на данных, 
+                полученных из базы данных с использованием функционала RAG (Retrieval-Augmented Generation).
+                """
+            )),
+            HumanMessage(content=full_prompt)
+        ]
 
     def generate_response(self, prompt: str, start_date: datetime, end_date: datetime) -> str:
         """
@@ -60,53 +146,115 @@ class LLMInference:
             if isinstance(prompt, list):
                 prompt = " ".join(prompt)
             
-            relevant_docs = self.news_searcher.search_news(
-                query=prompt,
-                start_date=start_date,
-                end_date=end_date,
-                k=5
-            )
-            print('relevant_docs', relevant_docs)
-            
-            # Формируем контекст из найденных документов
-            context_parts = []
-            for doc, score in relevant_docs:
-                context_parts.append(f"Новость:\n{doc.page_content}")
-            
-            context = "\n\n".join(context_parts)
+            query_embedding, relevant_docs, cache_key = self._retrieve(prompt, start_date, end_date)
+            cached_answer = self.answer_cache.get(prompt, *cache_key, embedding=query_embedding)
+            if cached_answer is not None:
+                logger.info("Ответ взят из кэша")
+                return cached_answer
             
-            if not context:
-                context = "К сожалению, релевантных новостей не найдено."
+            response = self.model(self._build_messages(prompt, relevant_docs))
+            # Пустой ответ не кэшируется, чтобы следующий запрос обратился к модели
+            if response.content:
+                self.answer_cache.put(prompt, *cache_key, response.content, embedding=query_embedding)
+            return response.content
+
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            return f"An error occurred while generating the response: {str(e)}"
+
+    async def agenerate_response(self, prompt: str, start_date: datetime, end_date: datetime) -> str:
+        """
+        Асинхронная генерация ответа, не блокирующая цикл событий
+        
+        Векторизация вопроса и поиск выполняются в ограниченном пуле потоков
+        search_executor, запрос к модели - через асинхронный клиент GigaChat.
+        
+        Args:
+            prompt: Вопрос пользователя
+            start_date: Начальная дата для фильтрации
+            end_date: Конечная дата для фильтрации
             
-            full_prompt = (
-                "На основе следующих новостей ответь на вопрос."
-                "Если в новостях нет релевантной информации, так и скажи.\n\n"
-                f"Новости:\n{context}\n\n"
-                f"Вопрос: {prompt}"
+        Returns:
+            str: Ответ модели
+        """
+        try:
+            if isinstance(prompt, list):
+                prompt = " ".join(prompt)
+
+            loop = asyncio.get_running_loop()
+            query_embedding, relevant_docs, cache_key = await loop.run_in_executor(
+                self.search_executor, self._retrieve, prompt, start_date, end_date
             )
-            print('full_prompt', full_prompt)
-
-            messages = [
-                SystemMessage(content=(
-                    """
-                    Вы являетесь экспертом в области саммари новостей о самокатах.
-                    Ваша задача — предоставлять точные сводки и отвечать на специфические вопросы, такие как 
-                    'Какие новые технологии в области самокатов появились за последний год?' или 
-                    'Какие новые законодательные требования для самокатов появились за последний год?'. 
-                    Вы не должны придумывать информацию; все ответы должны основываться на данных, 
-                    полученных из базы данных с использованием функционала RAG (Retrieval-Augmented Generation).
-                    """
-                )),
-                HumanMessage(content=full_prompt)
-            ]
-            
-            response = self.model(messages)
+            cached_answer = self.answer_cache.get(prompt, *cache_key, embedding=query_embedding)
+            if cached_answer is not None:
+                logger.info("Ответ взят из кэша")
+                return cached_answer
+
+            response = await self.model.ainvoke(self._build_messages(prompt, relevant_docs))
+            if response.content:
+                self.answer_cache.put(prompt, *cache_key, response.content, embedding=query_embedding)
             return response.content
 
         except Exception as e:
             print(f"Error generating response: {e}")
             return f"An error occurred while generating the response: {str(e)}"
 
+    @staticmethod
+    def _source(doc, score: float) -> Dict:
+        """Описание найденной новости для клиента"""
+        channel_id = doc.metadata['channel_id']
+        message_id = doc.metadata['message_id']
+        return {
+            'channel_id': channel_id,
+            'message_id': message_id,
+            'date': datetime.fromtimestamp(doc.metadata['date']).isoformat(),
+            'link': f"https://t.me/{channel_id}/{message_id}",
+            'score': float(score)
+        }
+
+    async def astream_response(self, prompt: str, start_date: datetime, end_date: datetime) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Потоковая генерация ответа
+        
+        Сначала отдаются найденные новости, затем фрагменты ответа по мере
+        их генерации моделью. Ошибки не перехватываются, их обрабатывает вызывающий код.
+        
+        Args:
+            prompt: Вопрос пользователя
+            start_date: Начальная дата для фильтрации
+            end_date: Конечная дата для фильтрации
+            
+        Yields:
+            Tuple[str, object]: События ('sources', список новостей), ('token', фрагмент ответа)
+                и ('done', {'cached': bool})
+        """
+        if isinstance(prompt, list):
+            prompt = " ".join(prompt)
+
+        loop = asyncio.get_running_loop()
+        query_embedding, relevant_docs, cache_key = await loop.run_in_executor(
+            self.search_executor, self._retrieve, prompt, start_date, end_date
+        )
+        yield 'sources', [self._source(doc, score) for doc, score in relevant_docs]
+
+        cached_answer = self.answer_cache.get(prompt, *cache_key, embedding=query_embedding)
+        if cached_answer is not None:
+            logger.info("Ответ взят из кэша")
+            yield 'token', cached_answer
+            yield 'done', {'cached': True}
+            return
+
+        parts = []
+        async for chunk in self.model.astream(self._build_messages(prompt, relevant_docs)):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield 'token', chunk.content
+        # В кэш попадает только полностью сгенерированный непустой ответ
+        answer = ''.join(parts)
+        if answer:
+            self.answer_cache.put(prompt, *cache_key, answer, embedding=query_embedding)
+        yield 'done', {'cached': False}
+
 if __name__ == "__main__": # for testing
     messages = [
         SystemMessage(content="You are a helpful assistant."),
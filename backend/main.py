@@ -1,10 +1,26 @@
-from fastapi import FastAPI
+import os
+import json
+import asyncio
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from backend.llm_inference import LLMInference
 from datetime import datetime
 
 app = FastAPI()
 
+# Токен для административных действий; если не задан, они недоступны
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# Максимальное число одновременно обрабатываемых вопросов, остальные ждут в очереди
+ASK_MAX_CONCURRENCY = int(os.getenv('ASK_MAX_CONCURRENCY', 8))
+# Сколько вопрос может ждать в очереди, прежде чем вернется 503 или событие error (секунды)
+ASK_QUEUE_TIMEOUT_SECONDS = float(os.getenv('ASK_QUEUE_TIMEOUT_SECONDS', 30))
+# Максимальное время ответа на вопрос, после которого вернется 504 (секунды)
+ASK_TIMEOUT_SECONDS = float(os.getenv('ASK_TIMEOUT_SECONDS', 120))
+
+ask_semaphore = asyncio.Semaphore(ASK_MAX_CONCURRENCY)
+
 class Query(BaseModel):
     question: str
     start_date: str
@@ -12,12 +28,78 @@ class Query(BaseModel):
 
 llm_inference = LLMInference()
 
+@app.on_event("shutdown")
+def shutdown():
+    llm_inference.indexer.stop()
+
 @app.post("/ask")
 async def ask_question(query: Query):
     # Convert string dates to datetime objects
     start_date = datetime.strptime(query.start_date, "%Y-%m-%d")
     end_date = datetime.strptime(query.end_date, "%Y-%m-%d")
     
-    # Pass the dates to the generate_response method
-    response = llm_inference.generate_response(query.question, start_date, end_date)
-    return {"answer": response}
\ No newline at end of file
+    try:
+        await asyncio.wait_for(ask_semaphore.acquire(), ASK_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Сервер перегружен, попробуйте позже")
+
+    try:
+        # Pass the dates to the agenerate_response method
+        response = await asyncio.wait_for(
+            llm_inference.agenerate_response(query.question, start_date, end_date),
+            ASK_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Превышено время ожидания ответа")
+    finally:
+        ask_semaphore.release()
+    return {"answer": response}
+
+def sse_event(event: str, data) -> str:
+    """Форматирует событие Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ask/stream")
+async def ask_question_stream(query: Query):
+    # Потоковый ответ: событие sources, затем token по мере генерации и done
+    start_date = datetime.strptime(query.start_date, "%Y-%m-%d")
+    end_date = datetime.strptime(query.end_date, "%Y-%m-%d")
+
+    async def events():
+        # Место в очереди занимается внутри генератора: если клиент отключится
+        # до начала передачи тела, генератор не запустится и место не будет занято
+        try:
+            await asyncio.wait_for(ask_semaphore.acquire(), ASK_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            yield sse_event("error", {"detail": "Сервер перегружен, попробуйте позже"})
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ASK_TIMEOUT_SECONDS
+        stream = llm_inference.astream_response(query.question, start_date, end_date)
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(stream.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                yield sse_event(event, data)
+        except asyncio.TimeoutError:
+            yield sse_event("error", {"detail": "Превышено время ожидания ответа"})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            await stream.aclose()
+            ask_semaphore.release()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.post("/admin/reindex", status_code=202)
+async def reindex(x_admin_token: str = Header(None)):
+    # Полная переиндексация выполняется только по явному запросу администратора,
+    # в потоке фоновой индексации; ход виден в логах
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    llm_inference.rebuild_vector_db()
+    return {"status": "accepted"}
@@ -2,22 +2,25 @@ import time
 import logging
 import os
 import re
+import json
+import gzip
 from datetime import datetime
 from dotenv import load_dotenv
-from backend.database import create_table, insert_news
+from backend.database import (
+    create_table, insert_news_batch,
+    get_ingest_manifest, save_ingest_manifest, clear_ingest_manifest
+)
+from backend.keyword_matcher import KeywordMatcher, load_keywords
 import sys
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import argparse
 
 # Загрузка переменных окружения
 load_dotenv()
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
 # Получение конфигурации из .env
 DB_PATH = os.getenv('DB_PATH', 'news.db')
 TELEGRAM_DATA_DIR = os.getenv('TELEGRAM_DATA_DIR', 'telegram_channels_data')
@@ -25,15 +28,23 @@ TELEGRAM_DATA_DIR = os.getenv('TELEGRAM_DATA_DIR', 'telegram_channels_data')
 # Интервал обновления из переменных окружения
 UPDATE_INTERVAL = int(os.getenv('DOWNLOAD_INTERVAL_MINUTES', 1))
 
-KEYWORDS = [
-    'самокат', 'мобильности',
-    'электросамокат', 'кикшеринг'
-]
+# Количество процессов для разбора файлов выгрузки
+FETCHER_WORKERS = int(os.getenv('FETCHER_WORKERS', 1))
+
+# Через сколько секунд после последнего изменения файл считается дописанным:
+# строка без перевода строки в конце такого файла читается как завершенная
+DUMP_FILE_SETTLE_SECONDS = float(os.getenv('DUMP_FILE_SETTLE_SECONDS', 60))
+
+# Сколько файлов на процесс может быть разобрано впрок, пока записываются предыдущие
+PARSE_PREFETCH_PER_WORKER = 2
+
+# Ключевые слова задаются через NEWS_KEYWORDS или NEWS_KEYWORDS_FILE
+KEYWORDS = load_keywords()
+keyword_matcher = KeywordMatcher(KEYWORDS)
 
 def contains_keywords(text):
-    """Проверяет наличие ключевых слов в тексте"""
-    text_lower = text.lower()
-    return any(keyword.lower() in text_lower for keyword in KEYWORDS)
+    """Проверяет наличие ключевых слов (с учетом словоформ) в тексте"""
+    return keyword_matcher.matches(text)
 
 def parse_timestamp(text):
     """Извлекает временную метку из строки формата [YYYY-MM-DD HH:MM:SS+00:00]"""
@@ -43,14 +54,25 @@ def parse_timestamp(text):
         return datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S%z')
     return None
 
-def parse_message(text):
-    """Парсит текст сообщения и извлекает временную метку, содержание и ссылку на сообщение"""
-    lines = text.strip().split('\n')
+def parse_message(lines):
+    """
+    Парсит сообщения из последовательности строк и извлекает временную метку,
+    содержание и ссылку на сообщение
+    
+    Args:
+        lines: Итератор строк (например, открытый файл) или весь текст одной строкой
+        
+    Yields:
+        Dict: Сообщение с ключами timestamp, text, message_link
+    """
+    if isinstance(lines, str):
+        lines = lines.strip().split('\n')
     timestamp = None
     content = []
     message_link = None
 
     for line in lines:
+        line = line.rstrip('\r\n')
         if '[202' in line:  # Поиск строки с временной меткой
             if timestamp is not None and content:  # Если есть накопленный контент, возвращаем предыдущее сообщение
                 yield {
@@ -87,75 +109,358 @@ def parse_message(text):
             'message_link': message_link
         }
 
-def fetch_news_from_telegram(full_load=False):
+def parse_jsonl(lines):
+    """
+    Читает сообщения из структурированной выгрузки (одна запись JSON на строку)
+    
+    Границы сообщений заданы строками файла, поэтому разбор регулярными
+    выражениями не нужен. Некорректные строки (например, обрезанные при сбое
+    загрузчика) пропускаются с предупреждением, чтобы не блокировать весь файл.
+    
+    Args:
+        lines: Итератор строк файла .jsonl
+        
+    Yields:
+        Dict: Сообщение с ключами timestamp, text, message_link
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            message = {
+                'timestamp': datetime.fromisoformat(record['date']),
+                'text': (record.get('text') or '').strip(),
+                'message_link': record.get('link')
+            }
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.warning(f"Пропуск некорректной записи JSONL: {e!r} в строке {line[:100]!r}")
+            continue
+        yield message
+
+def list_message_files(channel_dir):
+    """
+    Возвращает файлы выгрузки канала: текстовые и структурированные файлы загрузчика,
+    а также сегменты, собранные при уплотнении (в том числе сжатые)
+    """
+    return [
+        *channel_dir.glob('messages*.txt'),
+        *channel_dir.glob('messages*.jsonl'),
+        *channel_dir.glob('segment_*.jsonl'),
+        *channel_dir.glob('segment_*.jsonl.gz')
+    ]
+
+def is_jsonl_file(file_path):
+    """Проверяет, записан ли файл в структурированном формате (в том числе сжатый сегмент)"""
+    return file_path.name.endswith(('.jsonl', '.jsonl.gz'))
+
+def filter_news(messages, channel):
+    """
+    Отбирает релевантные сообщения и приводит их к формату записи в БД
+    
+    Args:
+        messages: Итератор сообщений из parse_message
+        channel: Имя канала, из которого получены сообщения
+        
+    Yields:
+        Dict: Новость с ключами tg_ch_name, timestamp, text, message_link
+    """
+    parsed = (message for message in messages if message['timestamp'])
+    for message in keyword_matcher.filter(parsed):
+        yield {
+            'tg_ch_name': channel,
+            'timestamp': message['timestamp'],
+            'text': message['text'],
+            'message_link': message.get('message_link', '')
+        }
+
+def plan_files(channel_files, base_dir, manifest, full_load=False):
+    """
+    Определяет, какие файлы канала нужно прочитать и с какого смещения
+    
+    Args:
+        channel_files: Файлы выгрузки канала
+        base_dir: Корневая папка выгрузки, относительно которой хранятся пути в манифесте
+        manifest: Манифест обработанных файлов (путь -> {size, mtime, offset})
+        full_load (bool): Если True, все файлы читаются с начала
+        
+    Returns:
+        List[Tuple[Path, int]]: Файлы в порядке изменения и смещения начала чтения
+    """
+    files_to_process = []
+    for file_path in sorted(channel_files, key=lambda x: (x.stat().st_mtime, x.name)):
+        stat = file_path.stat()
+        entry = None if full_load else manifest.get(file_path.relative_to(base_dir).as_posix())
+        
+        if file_path.suffix == '.gz':
+            # Сжатые сегменты неизменяемы и читаются только целиком
+            if entry is None or stat.st_size != entry['size'] or stat.st_mtime != entry['mtime']:
+                files_to_process.append((file_path, 0))
+        elif entry is None or stat.st_size < entry['offset']:
+            # Новый или перезаписанный файл читаем целиком
+            files_to_process.append((file_path, 0))
+        elif stat.st_size > entry['offset']:
+            # В файл дописаны данные - читаем только добавленные байты
+            files_to_process.append((file_path, entry['offset']))
+        elif stat.st_mtime != entry['mtime']:
+            # Размер не изменился, но файл переписан
+            files_to_process.append((file_path, 0))
+    return files_to_process
+
+def read_lines(file_path, checkpoint):
+    """
+    Построчно читает файл начиная со смещения checkpoint['offset']
+    
+    Смещение сдвигается только на полностью записанные строки, поэтому
+    недописанный хвост файла будет прочитан в следующем цикле. Если файл
+    не менялся дольше DUMP_FILE_SETTLE_SECONDS, последняя строка без
+    перевода строки (старые выгрузки, файлы, собранные вручную) считается
+    завершенной, иначе она читалась бы заново в каждом цикле.
+    
+    Args:
+        file_path: Путь к файлу выгрузки
+        checkpoint: Запись манифеста, смещение в которой обновляется по мере чтения
+        
+    Yields:
+        str: Строка файла
+    """
+    opener = gzip.open if file_path.suffix == '.gz' else open
+    # Сжатые сегменты записываются атомарно и не дописываются
+    settled = file_path.suffix == '.gz' or time.time() - file_path.stat().st_mtime >= DUMP_FILE_SETTLE_SECONDS
+    with opener(file_path, 'rb') as f:
+        f.seek(checkpoint['offset'])
+        for raw_line in f:
+            if not raw_line.endswith(b'\n') and not settled:
+                break
+            checkpoint['offset'] += len(raw_line)
+            yield raw_line.decode('utf-8')
+
+def iter_file_news(channel, file_path, checkpoint):
+    """
+    Читает релевантные новости из одного файла выгрузки начиная с checkpoint['offset']
+    
+    После полного чтения файла в checkpoint записываются его размер и mtime.
+    
+    Yields:
+        Dict: Новость с ключами tg_ch_name, timestamp, text, message_link
+    """
+    parser = parse_jsonl if is_jsonl_file(file_path) else parse_message
+    yield from filter_news(parser(read_lines(file_path, checkpoint)), channel)
+    stat = file_path.stat()
+    checkpoint.update(size=stat.st_size, mtime=stat.st_mtime)
+    if file_path.suffix == '.gz':
+        # Для сжатых файлов смещение в распакованном потоке не сравнимо с размером
+        checkpoint['offset'] = stat.st_size
+
+def _parse_file_task(task):
+    """
+    Разбирает файл целиком в процессе-обработчике
+    
+    Returns:
+        Tuple[List[Dict], Dict, str]: Новости, запись манифеста и текст ошибки (или None)
+    """
+    channel, file_path, checkpoint = task
+    try:
+        return list(iter_file_news(channel, file_path, checkpoint)), checkpoint, None
+    except Exception as e:
+        return [], checkpoint, str(e)
+
+def _parse_files(tasks, workers):
+    """
+    Разбирает файлы последовательно или в пуле процессов
+    
+    Результаты возвращаются строго в порядке tasks, поэтому порядок записи
+    в БД и логи не зависят от числа процессов. В пул одновременно передается
+    не больше PARSE_PREFETCH_PER_WORKER * workers файлов: следующий файл
+    отправляется только после того, как результат предыдущего забран, поэтому
+    память ограничена несколькими файлами, а не всей выгрузкой.
+    
+    Процессы запускаются через spawn, а не fork: разбор вызывается из
+    многопоточного загрузчика, и fork мог бы унаследовать захваченные
+    другими потоками блокировки (logging, sqlite).
+    
+    Yields:
+        Tuple[Iterable[Dict], Dict, str]: Новости файла, запись манифеста и текст ошибки (или None)
+    """
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending = iter(tasks)
+            in_flight = deque()
+            try:
+                for task in pending:
+                    in_flight.append(executor.submit(_parse_file_task, task))
+                    if len(in_flight) >= PARSE_PREFETCH_PER_WORKER * workers:
+                        break
+                while in_flight:
+                    result = in_flight.popleft().result()
+                    task = next(pending, None)
+                    if task is not None:
+                        in_flight.append(executor.submit(_parse_file_task, task))
+                    yield result
+            finally:
+                # Если чтение прервано, еще не начатые файлы не разбираются
+                for future in in_flight:
+                    future.cancel()
+    else:
+        for channel, file_path, checkpoint in tasks:
+            yield iter_file_news(channel, file_path, checkpoint), checkpoint, None
+
+def fetch_news_from_telegram(full_load=False, manifest=None, checkpoints=None, workers=1):
     """
     Читает новости из файлов выгрузки Telegram с фильтрацией по ключевым словам
     
+    Файлы читаются построчно, а новости отдаются по одной, поэтому потребление
+    памяти не зависит от объема выгрузки. По манифесту читаются только новые
+    файлы и дописанные в уже обработанные файлы данные.
+    
     Args:
-        full_load (bool): Если True, загружает все файлы. Если False, только последний.
+        full_load (bool): Если True, все файлы читаются заново независимо от манифеста.
+        manifest: Манифест обработанных файлов из get_ingest_manifest
+        checkpoints: Список, в который добавляются записи манифеста
+            для полностью прочитанных файлов
+        workers (int): Количество процессов для разбора файлов. При значении больше 1
+            файлы разбираются параллельно, а новости отдаются в исходном порядке
+        
+    Yields:
+        Dict: Новость с ключами tg_ch_name, timestamp, text, message_link
     """
-    news_items = []
     base_dir = Path(TELEGRAM_DATA_DIR)
+    manifest = manifest or {}
     
     channels = os.getenv('TELEGRAM_CHANNELS').split(',')
     logging.info(f"Обрабатываются каналы: {channels}")
     
-    total_files_processed = 0
-    total_messages_found = 0
-    
+    # Сначала планируем файлы всех каналов, чтобы пул процессов был загружен целиком
+    channel_plans = []
+    tasks = []
     for channel in channels:
         channel_dir = base_dir / channel
         if not channel_dir.exists():
-            logging.warning(f"Папка не найдена для канала {channel}")
+            channel_plans.append((channel, f"Папка не найдена для канала {channel}", 0, []))
             continue
             
-        messages_files = list(channel_dir.glob('messages*.txt'))
+        messages_files = list_message_files(channel_dir)
         if not messages_files:
-            logging.warning(f"Файлы с сообщениями не найдены для канала {channel}")
+            channel_plans.append((channel, f"Файлы с сообщениями не найдены для канала {channel}", 0, []))
             continue
         
         # Определяем какие файлы обрабатывать
-        files_to_process = messages_files if full_load else [max(messages_files, key=lambda x: x.stat().st_mtime)]
-        logging.info(f"Канал {channel}: найдено {len(messages_files)} файлов, будет обработано {len(files_to_process)}")
+        channel_tasks = [
+            (channel, file_path, {'path': file_path.relative_to(base_dir).as_posix(), 'offset': offset})
+            for file_path, offset in plan_files(messages_files, base_dir, manifest, full_load)
+        ]
+        channel_plans.append((channel, None, len(messages_files), channel_tasks))
+        tasks.extend(channel_tasks)
+    
+    results = _parse_files(tasks, workers)
+    
+    total_files_processed = 0
+    total_messages_found = 0
+    
+    for channel, warning, files_count, channel_tasks in channel_plans:
+        if warning:
+            logging.warning(warning)
+            continue
+        
+        logging.info(f"Канал {channel}: найдено {files_count} файлов, будет обработано {len(channel_tasks)}")
         
         channel_messages_count = 0
-        for file_path in files_to_process:
+        for (_, file_path, _), (items, checkpoint, error) in zip(channel_tasks, results):
+            file_messages_count = 0
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
-                file_messages_count = 0
-                for message in parse_message(content):
-                    if message['timestamp'] and message['text']:
-                        if contains_keywords(message['text']):
-                            news_items.append({
-                                'tg_ch_name': channel,
-                                'timestamp': message['timestamp'],
-                                'text': message['text'],
-                                'message_link': message.get('message_link', '')
-                            })
-                            file_messages_count += 1
+                if error:
+                    raise RuntimeError(error)
+                for news in items:
+                    file_messages_count += 1
+                    yield news
+                
+                if checkpoints is not None:
+                    checkpoints.append(checkpoint)
                 
-                channel_messages_count += file_messages_count
                 total_files_processed += 1
                 logging.info(f"Обработан файл {file_path.name}: найдено {file_messages_count} релевантных сообщений")
                             
             except Exception as e:
                 logging.error(f"Ошибка при чтении файла {file_path}: {str(e)}")
                 continue
+            finally:
+                channel_messages_count += file_messages_count
         
         total_messages_found += channel_messages_count
-        logging.info(f"Канал {channel}: обработано {len(files_to_process)} файлов, найдено {channel_messages_count} релевантных сообщений")
+        logging.info(f"Канал {channel}: обработано {len(channel_tasks)} файлов, найдено {channel_messages_count} релевантных сообщений")
     
     logging.info(f"Итого: обработано {total_files_processed} файлов, найдено {total_messages_found} релевантных сообщений")
-    return news_items
 
-def fetch_and_store_news(full_load=False):
+def _timed(iterable, timings, key):
+    """Отдает элементы iterable, суммируя в timings[key] время их получения"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[key] += time.perf_counter() - start
+            return
+        timings[key] += time.perf_counter() - start
+        yield item
+
+def ingest_news(full_load=False, workers=1):
+    """
+    Один цикл разбора файлов выгрузки и записи новостей в БД
+    
+    Разбор файлов, фильтрация и запись в БД выполняются конвейером:
+    новости записываются пакетами по мере чтения файлов. Манифест обновляется
+    только после записи новостей, поэтому сбой приводит к повторному чтению,
+    а не к потере данных. Таблицы должны быть созданы заранее (create_table).
+    
+    Args:
+        full_load (bool): Если True, перечитывает все файлы и пересобирает манифест.
+            Если False, читает только новые файлы и дописанные данные.
+        workers (int): Количество процессов для разбора файлов
+        
+    Returns:
+        Dict: Статистика цикла: inserted, skipped, parse_seconds, store_seconds
+    """
+    logging.info("Начало сбора новостей")
+    timings = {'parse': 0.0}
+    start = time.perf_counter()
+    
+    if full_load:
+        clear_ingest_manifest()
+    manifest = get_ingest_manifest()
+    checkpoints = []
+    
+    # Получение новостей из Telegram и сохранение в БД пакетами в одном соединении
+    news_items = fetch_news_from_telegram(
+        full_load=full_load,
+        manifest=manifest,
+        checkpoints=checkpoints,
+        workers=workers
+    )
+    new_items_count, skipped_count = insert_news_batch(_timed(news_items, timings, 'parse'))
+    save_ingest_manifest(checkpoints)
+    
+    logging.info(
+        f"Обработано {new_items_count + skipped_count} сообщений, "
+        f"добавлено {new_items_count} новых, "
+        f"пропущено {skipped_count} дубликатов"
+    )
+    
+    return {
+        'inserted': new_items_count,
+        'skipped': skipped_count,
+        'parse_seconds': timings['parse'],
+        'store_seconds': time.perf_counter() - start - timings['parse']
+    }
+
+def fetch_and_store_news(full_load=False, workers=1):
     """
     Получает и сохраняет новости в БД
     
     Args:
-        full_load (bool): Если True, загружает все файлы. Если False, только последний.
+        full_load (bool): Если True, перечитывает все файлы и пересобирает манифест.
+            Если False, читает только новые файлы и дописанные данные.
+        workers (int): Количество процессов для разбора файлов
     """
     # Инициализация базы данных
     create_table()
@@ -163,38 +468,25 @@ def fetch_and_store_news(full_load=False):
     logging.info("Запуск сервиса сбора новостей")
     
     try:
-        logging.info("Начало сбора новостей")
-        
-        # Получение новостей из Telegram
-        news_items = fetch_news_from_telegram(full_load=full_load)
-        
-        # Сохранение новостей в БД
-        new_items_count = 0
-        for news in news_items:
-            if insert_news(
-                news['tg_ch_name'],
-                news['timestamp'],
-                news['text'],
-                news['message_link']
-            ):
-                new_items_count += 1
-        
-        logging.info(
-            f"Обработано {len(news_items)} сообщений, "
-            f"добавлено {new_items_count} новых"
-        )
-        
+        ingest_news(full_load=full_load, workers=workers)
     except Exception as e:
         logging.error(f"Ошибка при сборе новостей: {str(e)}")
         raise
 
 if __name__ == "__main__":
+    # Настройка логирования
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    
     parser = argparse.ArgumentParser()
-    parser.add_argument('--full-load', action='store_true', help='Загрузить все файлы')
+    parser.add_argument('--full-load', action='store_true', help='Перечитать все файлы и пересобрать манифест')
+    parser.add_argument('--workers', type=int, default=FETCHER_WORKERS, help='Количество процессов для разбора файлов')
     args = parser.parse_args()
     
     try:
-        fetch_and_store_news(full_load=args.full_load)
+        fetch_and_store_news(full_load=args.full_load, workers=args.workers)
     except Exception as e:
         logging.error(f"Критическая ошибка в news_fetcher: {str(e)}", exc_info=True)
         sys.exit(1)
\ No newline at end of file
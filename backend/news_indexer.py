@@ -0,0 +1,77 @@
+import os
+import logging
+import threading
+
+from backend.news_searcher import NewsSearcher
+
+logger = logging.getLogger(__name__)
+
+# Интервал проверки новых записей SQLite (секунды)
+INDEXER_INTERVAL_SECONDS = float(os.getenv('INDEXER_INTERVAL_SECONDS', 30))
+
+class NewsIndexer:
+    """
+    Фоновая индексация новостей в процессе API
+
+    Поток периодически дополняет векторную БД записями SQLite новее отметки
+    индексации (по rowid), поэтому поиск только читает коллекцию и не
+    зависит от всплесков загрузки новостей. Полная переиндексация тоже
+    выполняется в этом потоке по запросу request_rebuild.
+    """
+
+    def __init__(self, news_searcher: NewsSearcher, interval: float = INDEXER_INTERVAL_SECONDS):
+        """
+        Args:
+            news_searcher: Векторное хранилище новостей
+            interval: Пауза между проверками в секундах
+        """
+        self.news_searcher = news_searcher
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._wakeup_event = threading.Event()
+        self._rebuild_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запускает поток индексации"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='news-indexer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """Останавливает поток, дожидаясь окончания текущего прохода"""
+        self._stop_event.set()
+        self._wakeup_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def trigger(self):
+        """Запускает проход индексации, не дожидаясь окончания паузы"""
+        self._wakeup_event.set()
+
+    def request_rebuild(self):
+        """Запрашивает полную переиндексацию в потоке индексации, не дожидаясь ее окончания"""
+        self._rebuild_event.set()
+        self.trigger()
+
+    def _run(self):
+        logger.info("Фоновая индексация новостей запущена")
+        while not self._stop_event.is_set():
+            try:
+                if self._rebuild_event.is_set():
+                    # Запрос, пришедший во время переиндексации, выполнится следующим проходом
+                    self._rebuild_event.clear()
+                    added = self.news_searcher.rebuild()
+                    logger.info(f"Полная переиндексация завершена: добавлено {added} новостей")
+                else:
+                    added = self.news_searcher.reconcile()
+                    if added:
+                        logger.info(f"Фоновая индексация: добавлено {added} новостей")
+            except Exception as e:
+                # Ошибка одного прохода не останавливает индексацию
+                logger.error(f"Ошибка фоновой индексации: {e}")
+            self._wakeup_event.wait(self.interval)
+            self._wakeup_event.clear()
+        logger.info("Фоновая индексация новостей остановлена")
@@ -1,126 +1,414 @@
 from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict
+from typing import Callable, List, Dict
+import json
 import logging
-from tqdm import tqdm
+import re
+import threading
+import time
 import os
 
+from backend.embedding_cache import CachedEmbeddings, EMBEDDING_CACHE_ENABLED
+from backend.embedding_batcher import QueryEmbeddingBatcher, QUERY_BATCHING_ENABLED
+from backend.vector_store import create_vector_store, VECTOR_BACKEND
+from backend.onnx_embeddings import OnnxEmbeddings, EMBEDDING_BACKEND, ONNX_MODEL_FILE
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_NAME = "sergeyzh/rubert-tiny-turbo"
+
+# Количество новостей, индексируемых за один проход сверки
+RECONCILE_BATCH_SIZE = int(os.getenv('RECONCILE_BATCH_SIZE', 1000))
+
+# Размер батча энкодера sentence-transformers
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+# Количество документов, векторизуемых и записываемых в векторное хранилище за раз
+INDEX_BATCH_SIZE = int(os.getenv('INDEX_BATCH_SIZE', 256))
+# Число потоков torch для вычислений внутри операций; если не задано - по умолчанию torch
+TORCH_NUM_THREADS = int(os.getenv('TORCH_NUM_THREADS', 0))
+# Минимальный интервал между сохранениями векторной БД на диск (секунды)
+PERSIST_INTERVAL_SECONDS = float(os.getenv('PERSIST_INTERVAL_SECONDS', 60))
+
+# Режим поиска по умолчанию: vector, lexical или hybrid
+SEARCH_MODE = os.getenv('SEARCH_MODE', 'hybrid')
+# Запросы не длиннее стольких слов ищутся только полнотекстовым индексом (0 - отключено)
+LEXICAL_QUERY_MAX_WORDS = int(os.getenv('LEXICAL_QUERY_MAX_WORDS', 2))
+# Во сколько раз больше кандидатов, чем k, берется из каждого списка в гибридном режиме
+HYBRID_CANDIDATES_FACTOR = int(os.getenv('HYBRID_CANDIDATES_FACTOR', 4))
+# Константа сглаживания reciprocal rank fusion
+RRF_K = 60
+
+_QUERY_WORD_PATTERN = re.compile(r'\w+')
+
+# Файл с отметкой индексации в папке векторной БД
+INDEX_STATE_FILE_NAME = 'index_state.json'
+
+def news_doc_id(channel_id, message_id) -> str:
+    """Идентификатор документа новости в векторной БД"""
+    return f"{channel_id}_{message_id}"
+
 class NewsSearcher:
-    def __init__(self, persist_directory: str = "./chroma_db", collection_name: str = "news"):
+    def __init__(self, persist_directory: str = None, collection_name: str = "news", backend: str = VECTOR_BACKEND):
         """
         Инициализация векторного хранилища новостей
         
         Args:
-            persist_directory (str): Путь к директории для хранения векторной БД
+            persist_directory (str): Путь к директории для хранения векторной БД;
+                по умолчанию ./chroma_db для chroma и VECTOR_INDEX_DIR для index
+            backend (str): Векторное хранилище: chroma или index
         """
-        logger.info(f"Инициализация NewsSearcher с директорией {persist_directory}")
+        logger.info(f"Инициализация NewsSearcher ({backend})")
+        self.collection_name = collection_name
+        # Индексация и переиндексация не должны выполняться одновременно
+        self._index_lock = threading.Lock()
+        # Запись в хранилище идет в отдельном потоке параллельно с векторизацией следующего батча
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chroma-write')
+        self._dirty = False
+        self._last_persist = time.monotonic()
+        # Обработчики, вызываемые с датами (timestamp) добавленных документов
+        self.on_news_added: List[Callable[[List[float]], None]] = []
         
-        self.embedding_function = SentenceTransformerEmbeddings(
-            model_name="sergeyzh/rubert-tiny-turbo"
-        )
+        if EMBEDDING_BACKEND == 'onnx':
+            # Экспортированная модель без загрузки torch
+            self.embedding_function = OnnxEmbeddings(batch_size=EMBEDDING_BATCH_SIZE)
+            cache_namespace = f"{EMBEDDING_MODEL_NAME}@onnx/{ONNX_MODEL_FILE}"
+        else:
+            if TORCH_NUM_THREADS:
+                import torch
+                torch.set_num_threads(TORCH_NUM_THREADS)
+
+            self.embedding_function = SentenceTransformerEmbeddings(
+                model_name=EMBEDDING_MODEL_NAME,
+                encode_kwargs={'batch_size': EMBEDDING_BATCH_SIZE}
+            )
+            cache_namespace = EMBEDDING_MODEL_NAME
+        if QUERY_BATCHING_ENABLED:
+            # Одновременные вопросы векторизуются одним батчем
+            self.embedding_function = QueryEmbeddingBatcher(self.embedding_function)
+        if EMBEDDING_CACHE_ENABLED:
+            # Уже посчитанные векторы берутся с диска без вызова модели
+            # Векторы ONNX и torch хранятся раздельно
+            self.embedding_function = CachedEmbeddings(self.embedding_function, cache_namespace)
         
         try:
-            self.db = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=self.embedding_function,
-                collection_name=collection_name
-            )
-            self.last_sync_time = datetime.now()
-            self.download_interval = int(os.getenv('DOWNLOAD_INTERVAL_MINUTES', 1))
-            logger.info("Векторная БД успешно инициализирована")
+            self.vector_store = create_vector_store(backend, persist_directory, collection_name, self.embedding_function)
+            # Отметка индексации хранится рядом с данными хранилища
+            self.state_path = os.path.join(self.vector_store.directory, INDEX_STATE_FILE_NAME)
+            self.persist_directory = self.vector_store.directory
+            logger.info(f"Векторная БД ({self.vector_store.name}, {self.persist_directory}) успешно инициализирована")
         except Exception as e:
             logger.error(f"Ошибка при инициализации векторной БД: {e}")
             raise
 
-    def _sync_if_needed(self):
-        """Проверяет необходимость синхронизации с SQLite и выполняет её при необходимости"""
-        current_time = datetime.now()
-        time_diff = (current_time - self.last_sync_time).total_seconds() / 60
+    def get_index_state(self) -> Dict:
+        """
+        Возвращает отметку индексации
+        
+        Returns:
+            Dict: last_id - id последней проиндексированной записи SQLite,
+                count - размер коллекции на момент сохранения отметки,
+                db_id - идентификатор БД SQLite, к которой относится last_id
+        """
+        if not os.path.exists(self.state_path):
+            return {'last_id': 0, 'count': 0, 'db_id': None}
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        state.setdefault('db_id', None)
+        return state
 
-        if time_diff >= self.download_interval:
-            logger.info("Синхронизация с SQLite требуется")
-            try:
-                from backend.database import fetch_latest_news_after
-                new_items = fetch_latest_news_after(self.last_sync_time)
-                
-                if new_items:
-                    self.add_news(new_items)
-                    logger.info(f"Добавлено {len(new_items)} новых записей в Chroma")
-                
-                self.last_sync_time = current_time
-                logger.info("Синхронизация успешно завершена")
-            except Exception as e:
-                logger.error(f"Ошибка при синхронизации с SQLite: {e}")
-                raise
+    def save_index_state(self, last_id: int, db_id: str):
+        """Атомарно сохраняет отметку индексации"""
+        os.makedirs(self.vector_store.directory, exist_ok=True)
+        state = {'last_id': last_id, 'count': self.vector_store.count(), 'db_id': db_id}
+        with open(self.state_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def reconcile(self, batch_size: int = RECONCILE_BATCH_SIZE) -> int:
+        """
+        Индексирует новости SQLite, которых еще нет в векторной БД
+        
+        Если отметка индексации сохранена для той же БД SQLite и коллекция
+        не уменьшилась с момента ее сохранения, сверяются только записи новее
+        отметки. Иначе (первый запуск, пересозданная БД, поврежденная или
+        очищенная коллекция) ключи всех записей
+        сравниваются с идентификаторами коллекции. В обоих случаях тексты
+        загружаются и векторизуются только для отсутствующих документов.
+        
+        Args:
+            batch_size: Количество новостей, добавляемых за один раз
+            
+        Returns:
+            int: Количество добавленных документов
+        """
+        with self._index_lock:
+            return self._reconcile(batch_size)
+
+    def _reconcile(self, batch_size: int) -> int:
+        from backend.database import fetch_news_keys, fetch_news_by_ids, get_db_id
+
+        state = self.get_index_state()
+        collection_count = self.vector_store.count()
+        # id записей пересозданной БД начинаются заново и не сравнимы с отметкой
+        db_id = get_db_id()
+        if state['last_id'] and db_id is not None and state['db_id'] == db_id and collection_count >= state['count']:
+            keys = fetch_news_keys(after_id=state['last_id'])
+        else:
+            logger.info("Отметка индексации отсутствует или устарела, сверяются все записи")
+            keys = fetch_news_keys()
+
+        if not keys:
+            logger.debug("Векторная БД актуальна")
+            return 0
 
-    def add_news(self, news_items: List[Dict]):
+        # Несколько записей (например, репосты) могут давать один документ
+        doc_ids = list(dict.fromkeys(news_doc_id(channel_id, message_id) for _, channel_id, message_id in keys))
+        existing = set()
+        for start in range(0, len(doc_ids), RECONCILE_BATCH_SIZE):
+            existing.update(self.vector_store.existing_ids(doc_ids[start:start + RECONCILE_BATCH_SIZE]))
+        missing_docs = {}
+        for row_id, channel_id, message_id in keys:
+            doc_id = news_doc_id(channel_id, message_id)
+            if doc_id not in existing:
+                missing_docs[doc_id] = row_id
+        missing = sorted(missing_docs.values())
+        logger.info(f"Записей после отметки: {len(keys)}, отсутствует в векторной БД: {len(missing)}")
+
+        added = 0
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            news_items = fetch_news_by_ids(batch)
+            self.add_news(news_items)
+            added += len(news_items)
+            # Все записи до последней добавленной уже есть в коллекции;
+            # отметка сдвигается только вслед за сохранением на диск
+            if not self._dirty:
+                self.save_index_state(batch[-1], db_id)
+        self.persist(force=True)
+        self.save_index_state(keys[-1][0], db_id)
+        return added
+
+    def rebuild(self) -> int:
+        """
+        Полностью пересоздает векторную БД по данным SQLite
+        
+        Returns:
+            int: Количество добавленных документов
+        """
+        logger.info("Полная переиндексация векторной БД")
+        with self._index_lock:
+            self.vector_store.reset()
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            return self._reconcile(RECONCILE_BATCH_SIZE)
+
+    def add_news(self, news_items: List[Dict], batch_size: int = INDEX_BATCH_SIZE):
         """
         Добавляет новости в векторную базу данных
         
+        Новости векторизуются батчами; пока батч записывается в хранилище,
+        векторизуется следующий. В памяти одновременно находится не больше
+        двух батчей векторов.
+        
         Args:
             news_items: Список словарей с новостями, каждый должен содержать:
                 - text: текст новости
                 - date: дата публикации (datetime)
                 - channel_id: ID канала
                 - message_id: ID сообщения
+            batch_size: Количество документов в одном батче
         """
         try:
-            documents = []
-            ids = []
+            # Документы с одинаковым идентификатором: остается последний
+            items_by_id = {
+                news_doc_id(item['channel_id'], item['message_id']): item
+                for item in news_items
+            }
+            ids = list(items_by_id)
+            if not ids:
+                return
+
+            start_time = time.perf_counter()
+            pending = None
+            for start in range(0, len(ids), batch_size):
+                batch_ids = ids[start:start + batch_size]
+                texts = [items_by_id[doc_id]['text'] for doc_id in batch_ids]
+                metadatas = [{
+                    'date': items_by_id[doc_id]['date'].timestamp(),
+                    'channel_id': str(items_by_id[doc_id]['channel_id']),
+                    'message_id': str(items_by_id[doc_id]['message_id'])
+                } for doc_id in batch_ids]
+                embeddings = self.embedding_function.embed_documents(texts)
+
+                if pending is not None:
+                    pending.result()
+                pending = self._write_executor.submit(
+                    self.vector_store.upsert,
+                    batch_ids,
+                    embeddings,
+                    texts,
+                    metadatas
+                )
+            pending.result()
+            self._dirty = True
+            self.persist()
+
+            dates = [items_by_id[doc_id]['date'].timestamp() for doc_id in ids]
+            for callback in self.on_news_added:
+                callback(dates)
+
+            elapsed = time.perf_counter() - start_time
+            logger.info(
+                f"Добавлено {len(ids)} документов в векторную БД за {elapsed:.1f} с "
+                f"({len(ids) / max(elapsed, 1e-9):.0f} док/с)"
+            )
             
-            for item in tqdm(news_items):
-                doc = Document(
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении новостей в векторную БД: {e}")
+            raise
+
+    def persist(self, force: bool = False):
+        """
+        Сохраняет векторную БД на диск не чаще PERSIST_INTERVAL_SECONDS
+        
+        Args:
+            force: Сохранить сразу, если есть несохраненные изменения
+        """
+        if not self._dirty:
+            return
+        if force or time.monotonic() - self._last_persist >= PERSIST_INTERVAL_SECONDS:
+            self.vector_store.persist()
+            self._dirty = False
+            self._last_persist = time.monotonic()
+
+    def embed_query(self, query: str) -> List[float]:
+        """Эмбеддинг поискового запроса"""
+        return self.embedding_function.embed_query(query)
+
+    @staticmethod
+    def is_lexical_query(query: str) -> bool:
+        """
+        Короткий запрос из ключевых слов, для которого достаточно полнотекстового поиска
+
+        Все слова запроса должны быть значимыми для FTS: вопрос со служебными
+        или вопросительными словами ("Что нового?") ищется и по векторам.
+        """
+        from backend.database import is_fts_term
+
+        words = _QUERY_WORD_PATTERN.findall(query.lower())
+        return 0 < len(words) <= LEXICAL_QUERY_MAX_WORDS and all(is_fts_term(word) for word in words)
+
+    def needs_embedding(self, query: str, mode: str = None) -> bool:
+        """
+        Проверяет, нужен ли поиску эмбеддинг запроса заранее
+
+        False означает, что поиск начнется с полнотекстового индекса. В режиме
+        lexical эмбеддинг не нужен никогда; в режиме hybrid, если индекс ничего
+        не нашел, search_news сам векторизует запрос для полного гибридного поиска.
+        """
+        mode = mode or SEARCH_MODE
+        return not (mode == 'lexical' or (mode == 'hybrid' and self.is_lexical_query(query)))
+
+    def _search_vector(self, query: str, start_date: datetime, end_date: datetime, k: int, embedding: List[float] = None) -> List[tuple]:
+        """Поиск по эмбеддингам в векторном хранилище, score - расстояние (меньше - лучше)"""
+        if embedding is None:
+            embedding = self.embed_query(query)
+        return self.vector_store.search(
+            embedding,
+            k,
+            start_date.timestamp() if start_date else None,
+            end_date.timestamp() if end_date else None
+        )
+
+    @staticmethod
+    def _search_lexical(query: str, start_date: datetime, end_date: datetime, k: int) -> List[tuple]:
+        """Полнотекстовый поиск в SQLite, score - BM25 (меньше - лучше)"""
+        from backend.database import search_news_fts
+
+        return [
+            (
+                Document(
                     page_content=item['text'],
                     metadata={
                         'date': item['date'].timestamp(),
                         'channel_id': str(item['channel_id']),
                         'message_id': str(item['message_id'])
                     }
-                )
-                documents.append(doc)
-                ids.append(f"{item['channel_id']}_{item['message_id']}")
-            
-            if documents:
-                self.db.add_documents(documents, ids=ids)
-                self.db.persist()
-                logger.info(f"Добавлено {len(documents)} документов в векторную БД")
-            
-        except Exception as e:
-            logger.error(f"Ошибка при добавлении новостей в векторную БД: {e}")
-            raise
+                ),
+                item['score']
+            )
+            for item in search_news_fts(query, start_date, end_date, limit=k)
+        ]
+
+    @staticmethod
+    def _fuse(result_lists: List[List[tuple]], k: int) -> List[tuple]:
+        """
+        Объединяет ранжированные списки методом reciprocal rank fusion
+        
+        Returns:
+            List[tuple]: Пары (документ, оценка RRF), больше - лучше
+        """
+        scores = {}
+        documents = {}
+        for results in result_lists:
+            for rank, (doc, _) in enumerate(results):
+                doc_id = news_doc_id(doc.metadata['channel_id'], doc.metadata['message_id'])
+                documents.setdefault(doc_id, doc)
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [(documents[doc_id], scores[doc_id]) for doc_id in ranked]
 
     def search_news(
         self, 
         query: str,
         start_date: datetime = None,
         end_date: datetime = None,
-        k: int = 5
+        k: int = 5,
+        embedding: List[float] = None,
+        mode: str = None
     ) -> List[tuple]:
         """
         Поиск новостей по запросу с фильтрацией по датам
+        
+        Если передан готовый эмбеддинг запроса, запрос повторно не векторизуется.
+        Режим lexical ищет только полнотекстовым индексом и может вернуть пустой
+        список. Короткие запросы из ключевых слов в режиме hybrid сначала ищутся
+        тем же индексом без вызова модели; если он ничего не нашел, выполняется
+        полный гибридный поиск с векторизацией запроса.
+        
+        Args:
+            query: Текст запроса
+            start_date: Начало диапазона дат
+            end_date: Конец диапазона дат
+            k: Количество результатов
+            embedding: Готовый эмбеддинг запроса
+            mode: 'vector', 'lexical' или 'hybrid' (BM25 и векторы, объединенные RRF);
+                по умолчанию SEARCH_MODE
+                
+        Returns:
+            List[tuple]: Пары (документ, оценка). Для vector оценка - расстояние,
+                для lexical - BM25 (в обоих случаях меньше - лучше), для hybrid - RRF (больше - лучше)
         """
+        mode = mode or SEARCH_MODE
         try:
-            self._sync_if_needed()
-            
-            filter_dict = {}
-            if start_date and end_date:
-                filter_dict = {
-                    "$and": [
-                        {"date": {"$gte": start_date.timestamp()}},
-                        {"date": {"$lte": end_date.timestamp()}}
-                    ]
-                }
-            
-            results = self.db.similarity_search_with_score(
-                query,
-                k=k,
-                filter=filter_dict if filter_dict else None
-            )
+            results = []
+            if not self.needs_embedding(query, mode):
+                results = self._search_lexical(query, start_date, end_date, k)
+                if results or mode == 'lexical':
+                    logger.info(f"Найдено {len(results)} документов полнотекстовым поиском")
+                    return results
+
+            if mode == 'hybrid':
+                candidates = max(k * HYBRID_CANDIDATES_FACTOR, k)
+                results = self._fuse([
+                    self._search_lexical(query, start_date, end_date, candidates),
+                    self._search_vector(query, start_date, end_date, candidates, embedding)
+                ], k)
+            else:
+                results = self._search_vector(query, start_date, end_date, k, embedding)
             
             logger.info(f"Найдено {len(results)} релевантных документов")
             return results
@@ -134,10 +422,7 @@ class NewsSearcher:
         Получение статистики о коллекции
         """
         try:
-            return {
-                "total_documents": self.db._collection.count(),
-                "collection_name": self.db._collection.name
-            }
+            return self.vector_store.stats()
         except Exception as e:
             logger.error(f"Ошибка при получении статистики: {e}")
             raise
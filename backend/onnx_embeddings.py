@@ -0,0 +1,233 @@
+import os
+import json
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Бэкенд модели эмбеддингов: torch (sentence-transformers) или onnx (onnxruntime).
+# onnx не проверен на sergeyzh/rubert-tiny-turbo: перед включением выполните
+# export --quantize (печатает min_cosine) и benchmarks.bench_embeddings на целевой машине
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+# Папка экспортированной модели: model.onnx (и model.onnx.data), tokenizer.json и конфигурация sentence-transformers
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', './models/rubert-tiny-turbo-onnx')
+# Файл модели в папке; model_quantized.onnx - вариант с весами int8
+ONNX_MODEL_FILE = os.getenv('ONNX_MODEL_FILE', 'model.onnx')
+# Число потоков onnxruntime внутри операций; 0 - по умолчанию onnxruntime
+ONNX_NUM_THREADS = int(os.getenv('ONNX_NUM_THREADS', 0))
+
+QUANTIZED_MODEL_FILE = 'model_quantized.onnx'
+
+# Тексты для проверки совпадения с torch
+PARITY_TEXTS = [
+    'Штрафы для водителей электросамокатов выросли',
+    'Кикшеринг Whoosh открыл новые парковки на Тверской улице',
+    'С 1 июня в Москве вводится ограничение скорости самокатов в парках до 15 км/ч',
+    'Погода',
+    'Какие новые законодательные требования для самокатов появились за последний год?'
+]
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Эмбеддинги модели sentence-transformers, экспортированной в ONNX
+
+    Для работы нужны только onnxruntime и tokenizers, без torch. Способ
+    пулинга, нормализация и максимальная длина берутся из конфигурации
+    sentence-transformers, сохраненной рядом с моделью при экспорте.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = ONNX_MODEL_DIR,
+        model_file: str = ONNX_MODEL_FILE,
+        batch_size: int = 64,
+        num_threads: int = ONNX_NUM_THREADS
+    ):
+        """
+        Args:
+            model_dir: Папка экспортированной модели
+            model_file: Имя файла ONNX в папке
+            batch_size: Количество текстов в одном прогоне модели
+            num_threads: Число потоков onnxruntime (0 - по умолчанию)
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_dir = Path(model_dir)
+        self.model_file = model_file
+        self.batch_size = batch_size
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            str(self.model_dir / model_file), options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        config = self._load_config()
+        self.pooling = config['pooling']
+        self.normalize = config['normalize']
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=config['max_length'])
+        self.tokenizer.enable_padding()
+        logger.info(f"Загружена ONNX модель {self.model_dir / model_file} (пулинг: {self.pooling})")
+
+    def _load_config(self) -> Dict:
+        """Читает параметры пулинга и нормализации из конфигурации sentence-transformers"""
+        pooling = 'mean'
+        normalize = False
+        max_length = 512
+
+        pooling_config = self.model_dir / '1_Pooling' / 'config.json'
+        if pooling_config.exists():
+            with open(pooling_config, 'r', encoding='utf-8') as f:
+                if json.load(f).get('pooling_mode_cls_token'):
+                    pooling = 'cls'
+        modules_config = self.model_dir / 'modules.json'
+        if modules_config.exists():
+            with open(modules_config, 'r', encoding='utf-8') as f:
+                normalize = any(module['type'].endswith('Normalize') for module in json.load(f))
+        bert_config = self.model_dir / 'sentence_bert_config.json'
+        if bert_config.exists():
+            with open(bert_config, 'r', encoding='utf-8') as f:
+                max_length = json.load(f).get('max_seq_length') or max_length
+        return {'pooling': pooling, 'normalize': normalize, 'max_length': max_length}
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            inputs['token_type_ids'] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, inputs)[0]
+        if self.pooling == 'cls':
+            vectors = hidden[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Тексты близкой длины попадают в один батч, чтобы меньше считать паддинг
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            batch = self._encode_batch([texts[i].replace('\n', ' ') for i in rows])
+            if vectors.shape[1] == 0:
+                vectors = np.zeros((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[rows] = batch
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = False):
+    """
+    Экспортирует модель sentence-transformers в ONNX
+
+    В папку сохраняются model.onnx, токенизатор и конфигурация
+    sentence-transformers (пулинг, нормализация), а при quantize - еще
+    model_quantized.onnx с динамическим квантованием весов в int8.
+    Требует torch, transformers и sentence-transformers.
+
+    Args:
+        model_name: Имя модели на Hugging Face или путь к ней
+        output_dir: Папка для экспортированной модели
+        quantize: Дополнительно сохранить квантованную модель
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    model = SentenceTransformer(model_name, device='cpu')
+    model.save(str(output))
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    tokenizer.save_pretrained(str(output))
+
+    sample = tokenizer(['пример текста'], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            str(output / 'model.onnx'),
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    # Веса torch в папке не нужны для инференса через onnxruntime
+    for weights in ('model.safetensors', 'pytorch_model.bin'):
+        if (output / weights).exists():
+            (output / weights).unlink()
+    logger.info(f"Модель {model_name} экспортирована в {output / 'model.onnx'}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(output / 'model.onnx'), str(output / QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+        logger.info(f"Квантованная модель сохранена в {output / QUANTIZED_MODEL_FILE}")
+
+def check_parity(model_name: str, model_dir: str, model_file: str = ONNX_MODEL_FILE, texts: List[str] = None) -> Dict:
+    """
+    Сравнивает эмбеддинги ONNX модели с исходной моделью torch
+
+    Returns:
+        Dict: Минимальная косинусная близость и максимальное абсолютное расхождение
+    """
+    from langchain_community.embeddings import SentenceTransformerEmbeddings
+
+    texts = texts or PARITY_TEXTS
+    expected = np.array(SentenceTransformerEmbeddings(model_name=model_name).embed_documents(texts))
+    actual = np.array(OnnxEmbeddings(model_dir, model_file).embed_documents(texts))
+    cosine = (expected * actual).sum(axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+    return {'min_cosine': float(cosine.min()), 'max_abs_diff': float(np.abs(expected - actual).max())}
+
+def main():
+    from backend.news_searcher import EMBEDDING_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description='Экспорт и проверка ONNX модели эмбеддингов')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help='Экспортировать модель в ONNX')
+    export_parser.add_argument('--model', default=EMBEDDING_MODEL_NAME)
+    export_parser.add_argument('--output-dir', default=ONNX_MODEL_DIR)
+    export_parser.add_argument('--quantize', action='store_true', help='Также сохранить модель с весами int8')
+    parity_parser = subparsers.add_parser('parity', help='Сравнить эмбеддинги ONNX и torch')
+    parity_parser.add_argument('--model', default=EMBEDDING_MODEL_NAME)
+    parity_parser.add_argument('--model-dir', default=ONNX_MODEL_DIR)
+    parity_parser.add_argument('--model-file', default=ONNX_MODEL_FILE)
+    parity_parser.add_argument('--min-cosine', type=float, default=0.999, help='Минимально допустимая близость')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_onnx(args.model, args.output_dir, args.quantize)
+        check = check_parity(args.model, args.output_dir)
+        print(f"Проверка model.onnx: {check}")
+        if args.quantize:
+            print(f"Проверка {QUANTIZED_MODEL_FILE}: {check_parity(args.model, args.output_dir, QUANTIZED_MODEL_FILE)}")
+    else:
+        check = check_parity(args.model, args.model_dir, args.model_file)
+        print(check)
+        if check['min_cosine'] < args.min_cosine:
+            raise SystemExit(f"Расхождение с torch выше допустимого: {check['min_cosine']:.5f} < {args.min_cosine}")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
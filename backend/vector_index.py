@@ -0,0 +1,308 @@
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Тип хранения векторов: float32 или int8 (в 4 раза компактнее, с небольшой потерей точности)
+VECTOR_INDEX_DTYPE = os.getenv('VECTOR_INDEX_DTYPE', 'float32')
+# При превышении этого числа сегментов самые небольшие из них сливаются
+VECTOR_INDEX_MAX_SEGMENTS = int(os.getenv('VECTOR_INDEX_MAX_SEGMENTS', 8))
+
+MANIFEST_FILE_NAME = 'index.json'
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Нормирует строки матрицы к единичной длине"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Симметричное квантование строк в int8 с масштабом на строку"""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+class _Segment:
+    """
+    Неизменяемый сегмент индекса: векторы, упорядоченные по времени публикации
+
+    Файлы сегмента: <name>.vectors (матрица N x dim, читается через memory map),
+    <name>.npz (времена, масштабы int8, отметки удаления) и <name>.jsonl
+    (идентификаторы, тексты и метаданные в том же порядке).
+    """
+
+    def __init__(self, directory: Path, name: str, dim: int, dtype: str):
+        self.directory = directory
+        self.name = name
+        arrays = np.load(directory / f'{name}.npz')
+        self.timestamps = arrays['timestamps']
+        self.scales = arrays['scales'] if dtype == 'int8' else None
+        self.deleted = arrays['deleted'].copy()
+        self.vectors = np.memmap(
+            directory / f'{name}.vectors', dtype=np.int8 if dtype == 'int8' else np.float32,
+            mode='r', shape=(len(self.timestamps), dim)
+        ) if len(self.timestamps) else np.zeros((0, dim), dtype=np.float32)
+        with open(directory / f'{name}.jsonl', 'r', encoding='utf-8') as f:
+            self.records = [json.loads(line) for line in f]
+
+    @staticmethod
+    def write(directory: Path, name: str, vectors: np.ndarray, timestamps: np.ndarray, records: List[Dict], dtype: str):
+        """Записывает сегмент; векторы должны быть нормированы и упорядочены по времени"""
+        if dtype == 'int8':
+            stored, scales = _quantize(vectors)
+        else:
+            stored, scales = vectors.astype(np.float32), np.ones(len(vectors), dtype=np.float32)
+        stored.tofile(directory / f'{name}.vectors')
+        np.savez(
+            directory / f'{name}.npz',
+            timestamps=timestamps.astype(np.float64),
+            scales=scales,
+            deleted=np.zeros(len(vectors), dtype=bool)
+        )
+        with open(directory / f'{name}.jsonl', 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def save_deleted(self):
+        """Сохраняет отметки удаления строк"""
+        path = self.directory / f'{self.name}.npz'
+        np.savez(self.directory / f'{self.name}.tmp.npz', timestamps=self.timestamps,
+                 scales=self.scales if self.scales is not None else np.ones(len(self.timestamps), dtype=np.float32),
+                 deleted=self.deleted)
+        os.replace(self.directory / f'{self.name}.tmp.npz', path)
+
+    def remove_files(self):
+        for suffix in ('.vectors', '.npz', '.jsonl'):
+            path = self.directory / f'{self.name}{suffix}'
+            if path.exists():
+                path.unlink()
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(~self.deleted)
+
+    def dense_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Векторы строк в float32"""
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[rows, None]
+        return block
+
+    def search(self, query: np.ndarray, k: int, start_ts: float, end_ts: float) -> List[Tuple[float, int]]:
+        """Лучшие k строк в диапазоне дат: пары (косинусная близость, строка)"""
+        lo = int(np.searchsorted(self.timestamps, start_ts, side='left'))
+        hi = int(np.searchsorted(self.timestamps, end_ts, side='right'))
+        if lo >= hi:
+            return []
+        # Диапазон дат - непрерывный срез, который оценивается одним умножением матрицы на вектор
+        scores = np.asarray(self.vectors[lo:hi], dtype=np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales[lo:hi]
+        scores[self.deleted[lo:hi]] = -np.inf
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        return [(float(scores[i]), lo + int(i)) for i in top if scores[i] != -np.inf]
+
+class DateSortedVectorIndex:
+    """
+    Векторный индекс в памяти процесса, упорядоченный по времени публикации
+
+    Нормированные векторы хранятся в сегментах только для добавления, каждый
+    из которых упорядочен по времени. Диапазон дат в каждом сегменте находится
+    двоичным поиском и оценивается одним векторизованным умножением, поэтому
+    запрос по узкому диапазону не просматривает всю коллекцию. Повторно
+    добавленный документ помечает прежнюю строку удаленной. Когда сегментов
+    становится больше max_segments, сливаются только самые небольшие из них:
+    два наименьших и следующие по размеру, пока очередной сегмент не больше
+    уже набранных. Крупный сегмент переписывается, только когда новые данные
+    сравнялись с ним по размеру, поэтому небольшие добавления не приводят
+    к перезаписи всего индекса.
+    """
+
+    def __init__(self, directory: str, dtype: str = VECTOR_INDEX_DTYPE, max_segments: int = VECTOR_INDEX_MAX_SEGMENTS):
+        """
+        Args:
+            directory: Папка индекса
+            dtype: Тип хранения векторов новых сегментов: float32 или int8
+            max_segments: Максимальное количество сегментов до слияния (не меньше 2)
+        """
+        if dtype not in ('float32', 'int8'):
+            raise ValueError(f"Неизвестный тип векторов: {dtype}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_segments = max(max_segments, 2)
+        self._lock = threading.Lock()
+
+        manifest_path = self.directory / MANIFEST_FILE_NAME
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        else:
+            manifest = {'dim': None, 'dtype': dtype, 'next_segment': 0, 'segments': []}
+        self.dim: Optional[int] = manifest['dim']
+        # Тип существующего индекса сохраняется, новый применяется после reset
+        self.dtype = manifest['dtype']
+        self._requested_dtype = dtype
+        self._next_segment = manifest['next_segment']
+        self.segments: List[_Segment] = [
+            _Segment(self.directory, name, self.dim, self.dtype) for name in manifest['segments']
+        ]
+        self._positions: Dict[str, Tuple[_Segment, int]] = {}
+        for segment in self.segments:
+            for row in segment.live_rows():
+                self._positions[segment.records[row]['id']] = (segment, int(row))
+
+    def _save_manifest(self):
+        manifest = {
+            'dim': self.dim,
+            'dtype': self.dtype,
+            'next_segment': self._next_segment,
+            'segments': [segment.name for segment in self.segments]
+        }
+        path = self.directory / MANIFEST_FILE_NAME
+        with open(path.with_suffix('.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(path.with_suffix('.tmp'), path)
+
+    def _write_segment(self, vectors: np.ndarray, timestamps: np.ndarray, records: List[Dict]) -> _Segment:
+        order = np.argsort(timestamps, kind='stable')
+        name = f'segment_{self._next_segment:06d}'
+        self._next_segment += 1
+        _Segment.write(self.directory, name, vectors[order], timestamps[order], [records[i] for i in order], self.dtype)
+        return _Segment(self.directory, name, self.dim, self.dtype)
+
+    def count(self) -> int:
+        return len(self._positions)
+
+    def contains(self, ids: List[str]) -> set:
+        return {doc_id for doc_id in ids if doc_id in self._positions}
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], timestamps: List[float], records: List[Dict]):
+        """
+        Добавляет документы новым сегментом
+
+        Args:
+            ids: Идентификаторы документов
+            embeddings: Векторы документов
+            timestamps: Время публикации (timestamp)
+            records: Произвольные данные документов (текст и метаданные)
+        """
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            segment = self._write_segment(
+                vectors,
+                np.asarray(timestamps, dtype=np.float64),
+                [{**record, 'id': doc_id} for doc_id, record in zip(ids, records)]
+            )
+
+            changed = set()
+            for doc_id in ids:
+                previous = self._positions.get(doc_id)
+                if previous is not None:
+                    previous[0].deleted[previous[1]] = True
+                    changed.add(previous[0])
+            for row, record in enumerate(segment.records):
+                self._positions[record['id']] = (segment, row)
+            for previous_segment in changed:
+                if previous_segment is not segment:
+                    previous_segment.save_deleted()
+
+            self.segments = self.segments + [segment]
+            self._save_manifest()
+            if len(self.segments) > self.max_segments:
+                self._merge(self._merge_candidates())
+
+    def _merge_candidates(self) -> List[_Segment]:
+        """
+        Сегменты для слияния
+
+        Берутся два наименьших по числу строк сегмента, затем следующие
+        по размеру, пока очередной сегмент не больше суммарного размера уже выбранных.
+        """
+        by_size = sorted(self.segments, key=lambda segment: len(segment.live_rows()))
+        candidates = by_size[:2]
+        total = sum(len(segment.live_rows()) for segment in candidates)
+        for segment in by_size[2:]:
+            size = len(segment.live_rows())
+            if size > total:
+                break
+            candidates.append(segment)
+            total += size
+        return candidates
+
+    def _merge(self, old_segments: List[_Segment]):
+        """Сливает сегменты в один, отбрасывая удаленные строки"""
+        vectors, timestamps, records = [], [], []
+        for segment in old_segments:
+            rows = segment.live_rows()
+            vectors.append(segment.dense_vectors(rows))
+            timestamps.append(segment.timestamps[rows])
+            records.extend(segment.records[row] for row in rows)
+        merged = self._write_segment(
+            np.concatenate(vectors) if vectors else np.zeros((0, self.dim), dtype=np.float32),
+            np.concatenate(timestamps) if timestamps else np.zeros(0),
+            records
+        )
+        self.segments = [segment for segment in self.segments if segment not in old_segments] + [merged]
+        for row, record in enumerate(merged.records):
+            self._positions[record['id']] = (merged, row)
+        self._save_manifest()
+        # Открытые отображения старых файлов остаются валидными до закрытия
+        for segment in old_segments:
+            segment.remove_files()
+        logger.info(
+            f"Векторный индекс: {len(old_segments)} сегментов слиты в один ({len(records)} векторов), "
+            f"всего сегментов: {len(self.segments)}"
+        )
+
+    def search(
+        self,
+        embedding: List[float],
+        k: int,
+        start_ts: float = -np.inf,
+        end_ts: float = np.inf
+    ) -> List[Tuple[Dict, float]]:
+        """
+        Ищет ближайшие документы в диапазоне дат
+
+        Args:
+            embedding: Вектор запроса
+            k: Количество результатов
+            start_ts: Начало диапазона (timestamp, включительно)
+            end_ts: Конец диапазона (timestamp, включительно)
+
+        Returns:
+            List[Tuple[Dict, float]]: Пары (данные документа, расстояние 2 - 2cos),
+                от ближайшего; расстояние совпадает с квадратом L2 между нормированными векторами
+        """
+        if self.dim is None:
+            return []
+        query = _normalize(np.asarray([embedding], dtype=np.float32))[0]
+        segments = self.segments
+        candidates = []
+        for segment in segments:
+            candidates.extend((score, segment, row) for score, row in segment.search(query, k, start_ts, end_ts))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [(segment.records[row], 2 - 2 * score) for score, segment, row in candidates[:k]]
+
+    def reset(self):
+        """Удаляет все данные индекса"""
+        with self._lock:
+            for segment in self.segments:
+                segment.remove_files()
+            self.segments = []
+            self._positions = {}
+            self.dim = None
+            self.dtype = self._requested_dtype
+            self._save_manifest()
@@ -0,0 +1,154 @@
+import os
+import logging
+from typing import Dict, List
+
+from langchain_community.vectorstores import Chroma
+from langchain.schema import Document
+
+from backend.vector_index import DateSortedVectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Векторное хранилище NewsSearcher: chroma или index (DateSortedVectorIndex)
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+# Папка Chroma по умолчанию
+CHROMA_DIR = './chroma_db'
+# Папка индекса по умолчанию для VECTOR_BACKEND=index
+VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', './vector_index')
+
+# Максимальное число идентификаторов в одном запросе к Chroma
+_GET_CHUNK = 1000
+
+class ChromaVectorStore:
+    """Векторное хранилище на основе коллекции Chroma"""
+
+    name = 'chroma'
+
+    def __init__(self, directory: str, collection_name: str, embedding_function):
+        """
+        Args:
+            directory: Папка Chroma
+            collection_name: Имя коллекции
+            embedding_function: Функция эмбеддингов коллекции
+        """
+        self.directory = directory
+        self.collection_name = collection_name
+        self.embedding_function = embedding_function
+        self.db = self._open()
+
+    def _open(self) -> Chroma:
+        return Chroma(
+            persist_directory=self.directory,
+            embedding_function=self.embedding_function,
+            collection_name=self.collection_name
+        )
+
+    def count(self) -> int:
+        return self.db._collection.count()
+
+    def existing_ids(self, ids: List[str]) -> set:
+        existing = set()
+        for start in range(0, len(ids), _GET_CHUNK):
+            existing.update(self.db._collection.get(ids=ids[start:start + _GET_CHUNK], include=[])['ids'])
+        return existing
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict]):
+        self.db._collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+
+    def search(self, embedding: List[float], k: int, start_ts: float = None, end_ts: float = None) -> List[tuple]:
+        # Фильтр строится и по одной границе диапазона
+        conditions = []
+        if start_ts is not None:
+            conditions.append({"date": {"$gte": start_ts}})
+        if end_ts is not None:
+            conditions.append({"date": {"$lte": end_ts}})
+        filter_dict = None
+        if len(conditions) == 2:
+            filter_dict = {"$and": conditions}
+        elif conditions:
+            filter_dict = conditions[0]
+        return self.db.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter_dict)
+
+    def persist(self):
+        self.db.persist()
+
+    def reset(self):
+        self.db.delete_collection()
+        self.db = self._open()
+
+    def stats(self) -> Dict:
+        return {
+            "total_documents": self.db._collection.count(),
+            "collection_name": self.db._collection.name
+        }
+
+class IndexVectorStore:
+    """Векторное хранилище на основе DateSortedVectorIndex"""
+
+    name = 'index'
+
+    def __init__(self, directory: str = VECTOR_INDEX_DIR):
+        """
+        Args:
+            directory: Папка индекса
+        """
+        self.directory = directory
+        self.index = DateSortedVectorIndex(directory)
+
+    def count(self) -> int:
+        return self.index.count()
+
+    def existing_ids(self, ids: List[str]) -> set:
+        return self.index.contains(ids)
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict]):
+        self.index.upsert(
+            ids,
+            embeddings,
+            [metadata['date'] for metadata in metadatas],
+            [{'text': text, 'metadata': metadata} for text, metadata in zip(texts, metadatas)]
+        )
+
+    def search(self, embedding: List[float], k: int, start_ts: float = None, end_ts: float = None) -> List[tuple]:
+        results = self.index.search(
+            embedding,
+            k,
+            start_ts if start_ts is not None else float('-inf'),
+            end_ts if end_ts is not None else float('inf')
+        )
+        return [
+            (Document(page_content=record['text'], metadata=record['metadata']), distance)
+            for record, distance in results
+        ]
+
+    def persist(self):
+        # Сегменты записываются на диск сразу при добавлении
+        pass
+
+    def reset(self):
+        self.index.reset()
+
+    def stats(self) -> Dict:
+        return {
+            "total_documents": self.index.count(),
+            "collection_name": f"index:{self.directory}"
+        }
+
+def create_vector_store(backend: str, persist_directory: str, collection_name: str, embedding_function):
+    """
+    Создает векторное хранилище выбранного типа
+
+    Args:
+        backend: 'chroma' или 'index'
+        persist_directory: Папка хранилища; если None - CHROMA_DIR или VECTOR_INDEX_DIR
+        collection_name: Имя коллекции Chroma
+        embedding_function: Функция эмбеддингов
+
+    Returns:
+        Векторное хранилище с методами count, existing_ids, upsert, search, persist, reset и stats
+    """
+    if backend == 'chroma':
+        return ChromaVectorStore(persist_directory or CHROMA_DIR, collection_name, embedding_function)
+    if backend == 'index':
+        return IndexVectorStore(persist_directory or VECTOR_INDEX_DIR)
+    raise ValueError(f"Неизвестное векторное хранилище: {backend}")
@@ -0,0 +1,91 @@
+"""
+Бенчмарк бэкендов модели эмбеддингов: torch и ONNX
+
+Каждый бэкенд запускается в отдельном процессе, чтобы память и время
+импорта не смешивались. Выводятся время загрузки (импорт и модель),
+пропускная способность векторизации и пиковый RSS процесса.
+
+Запуск (ONNX модель предварительно экспортируется):
+    python -m backend.onnx_embeddings export --quantize
+    python -m benchmarks.bench_embeddings --backends torch onnx onnx-int8 --docs 2000
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+WORDS = [
+    'самокат', 'штраф', 'парковка', 'кикшеринг', 'тротуар', 'правила', 'скорость',
+    'аренда', 'Москва', 'Whoosh', 'закон', 'авария', 'велодорожка', 'шлем', 'водитель'
+]
+
+def make_texts(count, rng):
+    """Короткие посты длиной 20-120 слов"""
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))) for _ in range(count)]
+
+def run_child(backend, docs, batch_size, seed):
+    """Загружает бэкенд и векторизует тексты в текущем процессе, печатает результат в JSON"""
+    texts = make_texts(docs, random.Random(seed))
+
+    start = time.perf_counter()
+    if backend == 'torch':
+        from langchain_community.embeddings import SentenceTransformerEmbeddings
+        from backend.news_searcher import EMBEDDING_MODEL_NAME
+
+        embeddings = SentenceTransformerEmbeddings(
+            model_name=EMBEDDING_MODEL_NAME, encode_kwargs={'batch_size': batch_size}
+        )
+    else:
+        from backend.onnx_embeddings import OnnxEmbeddings, QUANTIZED_MODEL_FILE
+
+        model_file = QUANTIZED_MODEL_FILE if backend == 'onnx-int8' else 'model.onnx'
+        embeddings = OnnxEmbeddings(model_file=model_file, batch_size=batch_size)
+    load_seconds = time.perf_counter() - start
+
+    # Прогрев
+    embeddings.embed_documents(texts[:batch_size])
+
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    encode_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'backend': backend,
+        'load_seconds': load_seconds,
+        'docs_per_second': docs / encode_seconds,
+        # ru_maxrss в Linux - в килобайтах
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк бэкендов эмбеддингов')
+    parser.add_argument('--backends', nargs='+', default=['torch', 'onnx', 'onnx-int8'],
+                        choices=['torch', 'onnx', 'onnx-int8'])
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.docs, args.batch_size, args.seed)
+        return
+
+    print(f"{'backend':>10} {'load, s':>8} {'docs/s':>8} {'max RSS, MB':>12}")
+    for backend in args.backends:
+        result = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_embeddings', '--child', backend,
+             '--docs', str(args.docs), '--batch-size', str(args.batch_size), '--seed', str(args.seed)],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"{backend:>10} ошибка: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}")
+            continue
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{backend:>10} {stats['load_seconds']:>8.2f} {stats['docs_per_second']:>8.0f} {stats['max_rss_mb']:>12.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Микробенчмарк фильтра ключевых слов
+
+Сравнивает прежнюю проверку (`keyword in text.lower()` для каждого слова)
+со скомпилированным KeywordMatcher при росте списка ключевых слов.
+Перед замерами ключевые слова по умолчанию проверяются на полноту
+и на ложные совпадения с однокоренными словами.
+
+Запуск:
+    python -m benchmarks.bench_keywords --messages 20000 --keywords 4 50 200 500
+"""
+import argparse
+import random
+import time
+
+from backend.keyword_matcher import DEFAULT_KEYWORDS, KeywordMatcher
+
+WORDS = [
+    'москва', 'сегодня', 'водитель', 'дорога', 'движение', 'штраф', 'погода',
+    'метро', 'пробки', 'авария', 'парковка', 'велосипед', 'пешеход', 'тротуар'
+]
+
+# Формы слов, которые должны находиться фильтром
+RELEVANT_WORDS = ['самокатов', 'кикшеринга', 'электросамокате', 'мобильности']
+
+# Сообщения не по теме, которые не должны проходить фильтр по умолчанию
+IRRELEVANT_TEXTS = [
+    'В Москве отключили мобильный интернет',
+    'Операторы мобильной связи повысили тарифы',
+    'Потерял мобильник в метро',
+    'Мобильные приложения банков обновились',
+    'Самолет задержали в Шереметьево'
+]
+
+SYLLABLES = ['ка', 'ро', 'ми', 'ну', 'ле', 'ст', 'пра', 'во', 'де', 'зи', 'тор', 'ган']
+
+def legacy_contains_keywords(text, keywords):
+    """Прежняя реализация contains_keywords из news_fetcher"""
+    text_lower = text.lower()
+    return any(keyword.lower() in text_lower for keyword in keywords)
+
+def make_keywords(count, rng):
+    """Дополняет список по умолчанию случайными псевдословами до count штук"""
+    keywords = list(DEFAULT_KEYWORDS[:count])
+    while len(keywords) < count:
+        keywords.append(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5))))
+    return keywords
+
+def make_messages(count, rng, relevant_share):
+    """Генерирует сообщения длиной 30-120 слов, доля relevant_share содержит ключевое слово"""
+    messages = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(30, 120))]
+        if rng.random() < relevant_share:
+            words[rng.randrange(len(words))] = rng.choice(RELEVANT_WORDS)
+        messages.append(' '.join(words).capitalize())
+    return messages
+
+def check_default_keywords():
+    """Проверяет полноту и ложные совпадения фильтра по умолчанию, возвращает True при успехе"""
+    matcher = KeywordMatcher(DEFAULT_KEYWORDS)
+    missed = [word for word in RELEVANT_WORDS if not matcher.matches(word)]
+    false_positives = [text for text in IRRELEVANT_TEXTS if matcher.matches(text)]
+    print(f"Ключевые слова по умолчанию: найдено {len(RELEVANT_WORDS) - len(missed)}/{len(RELEVANT_WORDS)}, "
+          f"ложных совпадений {len(false_positives)}/{len(IRRELEVANT_TEXTS)}")
+    for word in missed:
+        print(f"  пропущено: {word}")
+    for text in false_positives:
+        print(f"  ложное совпадение: {text}")
+    return not missed and not false_positives
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк фильтра ключевых слов')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--keywords', type=int, nargs='+', default=[4, 50, 200, 500])
+    parser.add_argument('--relevant-share', type=float, default=0.05, help='Доля релевантных сообщений')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if not check_default_keywords():
+        raise SystemExit("Фильтр ключевых слов по умолчанию работает неверно")
+
+    rng = random.Random(args.seed)
+    messages = make_messages(args.messages, rng, args.relevant_share)
+
+    print(f"{'keywords':>9} {'legacy, ms':>11} {'matcher, ms':>12} {'compile, ms':>12} {'matched legacy/matcher':>24}")
+    for count in args.keywords:
+        keywords = make_keywords(count, rng)
+
+        start = time.perf_counter()
+        legacy_matched = sum(1 for text in messages if legacy_contains_keywords(text, keywords))
+        legacy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        matched = sum(1 for _ in matcher.filter({'text': text} for text in messages))
+        matcher_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{count:>9} {legacy_ms:>11.1f} {matcher_ms:>12.1f} {compile_ms:>12.2f} {legacy_matched:>11}/{matched:<12}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Бенчмарк синхронизации "новости после X" при росте таблицы news
+
+Сравнивает прежний запрос с datetime(timestamp) и поиск по диапазону ts_epoch.
+Время выборки нескольких свежих записей не должно зависеть от размера таблицы.
+
+Запуск:
+    python -m benchmarks.bench_news_after --sizes 10000 100000 500000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend import database
+
+LEGACY_QUERY = '''
+    SELECT text, timestamp, tg_ch_name, message_link
+    FROM news
+    WHERE datetime(timestamp) > datetime(?)
+    ORDER BY timestamp DESC
+'''
+
+def fill_table(size: int, newest: datetime):
+    """Заполняет таблицу сообщениями с шагом в одну минуту до newest"""
+    items = (
+        {
+            'tg_ch_name': 'bench',
+            'timestamp': newest - timedelta(minutes=i),
+            'text': f'Новость про самокат номер {i}',
+            'message_link': f'https://t.me/bench/{i}'
+        }
+        for i in range(size)
+    )
+    database.insert_news_batch(items, batch_size=5000)
+
+def measure(func, repeats: int) -> float:
+    """Возвращает медианное время выполнения в миллисекундах"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк fetch_latest_news_after')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 200000])
+    parser.add_argument('--new-rows', type=int, default=10, help='Сколько записей попадает в выборку')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    newest = datetime.now(timezone.utc).replace(microsecond=0)
+    since = newest - timedelta(minutes=args.new_rows)
+
+    print(f"{'rows':>10} {'ts_epoch, ms':>14} {'datetime(), ms':>16}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.environ['DB_PATH'] = os.path.join(tmp_dir, 'bench.db')
+            database.create_table()
+            fill_table(size, newest)
+
+            conn = database.get_connection()
+            legacy_since = since.strftime('%Y-%m-%d %H:%M:%S+00:00')
+            epoch_ms = measure(lambda: database.fetch_latest_news_after(since), args.repeats)
+            legacy_ms = measure(lambda: conn.execute(LEGACY_QUERY, (legacy_since,)).fetchall(), args.repeats)
+            print(f"{size:>10} {epoch_ms:>14.3f} {legacy_ms:>16.3f}")
+
+            database.close_connection()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Нагрузочный тест объединения эмбеддингов вопросов в батчи
+
+Несколько потоков одновременно векторизуют уникальные вопросы (как потоки
+поиска API под нагрузкой). Сравнивается прямой вызов модели с батчем 1 и
+QueryEmbeddingBatcher при разных max_wait: для каждого уровня параллелизма
+выводятся p50/p99 задержки и число вопросов в секунду.
+
+Запуск:
+    python -m benchmarks.bench_query_batching --concurrency 1 8 32 --max-wait-ms 2 5 10
+"""
+import argparse
+import itertools
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_community.embeddings import SentenceTransformerEmbeddings
+
+from backend.embedding_batcher import QueryEmbeddingBatcher
+from backend.news_searcher import EMBEDDING_MODEL_NAME
+
+WORDS = [
+    'самокат', 'штраф', 'парковка', 'кикшеринг', 'тротуар', 'правила', 'скорость',
+    'аренда', 'Москва', 'Whoosh', 'закон', 'авария', 'велодорожка', 'шлем'
+]
+
+def make_queries(count, rng):
+    """Генерирует уникальные вопросы, чтобы не срабатывали никакие кэши"""
+    return [
+        f"{' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 8)))} {i}?"
+        for i in range(count)
+    ]
+
+def run(embed_query, queries, concurrency):
+    """Векторизует вопросы в concurrency потоков, возвращает задержки (мс) и вопросов в секунду"""
+    latencies = []
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def worker():
+        while True:
+            index = next(counter)
+            if index >= len(queries):
+                return
+            start = time.perf_counter()
+            embed_query(queries[index])
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    total = time.perf_counter() - start
+    return latencies, len(queries) / total
+
+def percentile(values, share):
+    return statistics.quantiles(values, n=100)[int(share * 100) - 1] if len(values) > 1 else values[0]
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест батчинга эмбеддингов вопросов')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--max-wait-ms', type=float, nargs='+', default=[2, 5, 10])
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=1000, help='Количество вопросов в каждом прогоне')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    embeddings = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    # Прогрев модели
+    embeddings.embed_documents(make_queries(32, rng))
+
+    modes = [('direct', embeddings.embed_query)]
+    for max_wait_ms in args.max_wait_ms:
+        batcher = QueryEmbeddingBatcher(embeddings, args.max_batch_size, max_wait_ms)
+        modes.append((f'batch {max_wait_ms:g} ms', batcher.embed_query))
+
+    print(f"{'concurrency':>11} {'mode':>14} {'p50, ms':>9} {'p99, ms':>9} {'qps':>8}")
+    for concurrency in args.concurrency:
+        for name, embed_query in modes:
+            latencies, qps = run(embed_query, make_queries(args.requests, rng), concurrency)
+            print(
+                f"{concurrency:>11} {name:>14} {percentile(latencies, 0.5):>9.1f} "
+                f"{percentile(latencies, 0.99):>9.1f} {qps:>8.0f}"
+            )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Бенчмарк векторных хранилищ NewsSearcher: Chroma и DateSortedVectorIndex
+
+На синтетических нормированных векторах (кластеры тем) с равномерно
+распределенными датами сравниваются задержка поиска с фильтром по диапазону
+дат и recall@k относительно точного перебора. Индекс проверяется в вариантах
+float32 и int8.
+
+Запуск:
+    python -m benchmarks.bench_vector_index --docs 50000 --range-days 7 30
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from backend.vector_index import DateSortedVectorIndex
+
+def make_corpus(docs, dim, days, topics, rng):
+    """Векторы документов вокруг центров тем и даты в пределах days суток"""
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, docs)] + 0.8 * rng.standard_normal((docs, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    timestamps = 1_700_000_000 + rng.uniform(0, days * 86400, docs)
+    return centers, vectors, timestamps
+
+def make_queries(centers, count, dim, rng):
+    queries = centers[rng.integers(0, len(centers), count)] + 0.8 * rng.standard_normal((count, dim)).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def exact_top_k(vectors, timestamps, query, k, start_ts, end_ts):
+    """Точный перебор в диапазоне дат"""
+    rows = np.flatnonzero((timestamps >= start_ts) & (timestamps <= end_ts))
+    scores = vectors[rows] @ query
+    return set(rows[np.argsort(-scores)[:k]].tolist())
+
+def measure(search, queries, ranges, truths, k):
+    """Возвращает p50 и p99 задержки (мс) и средний recall@k"""
+    latencies, recalls = [], []
+    for query, (start_ts, end_ts), truth in zip(queries, ranges, truths):
+        start = time.perf_counter()
+        found = search(query, k, start_ts, end_ts)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(found & truth) / max(len(truth), 1))
+    quantiles = statistics.quantiles(latencies, n=100)
+    return quantiles[49], quantiles[98], statistics.mean(recalls)
+
+def build_index(directory, dtype, vectors, timestamps, batch):
+    index = DateSortedVectorIndex(directory, dtype=dtype)
+    ids = [str(i) for i in range(len(vectors))]
+    for start in range(0, len(vectors), batch):
+        end = start + batch
+        index.upsert(ids[start:end], vectors[start:end], timestamps[start:end].tolist(), [{} for _ in ids[start:end]])
+
+    def search(query, k, start_ts, end_ts):
+        return {int(record['id']) for record, _ in index.search(query, k, start_ts, end_ts)}
+    return search
+
+def build_chroma(directory, vectors, timestamps, batch):
+    from langchain_community.vectorstores import Chroma
+
+    db = Chroma(persist_directory=directory, collection_name='bench')
+    ids = [str(i) for i in range(len(vectors))]
+    for start in range(0, len(vectors), batch):
+        end = start + batch
+        db._collection.upsert(
+            ids=ids[start:end],
+            embeddings=vectors[start:end].tolist(),
+            metadatas=[{'date': float(ts)} for ts in timestamps[start:end]]
+        )
+
+    def search(query, k, start_ts, end_ts):
+        result = db._collection.query(
+            query_embeddings=[query.tolist()],
+            n_results=k,
+            where={'$and': [{'date': {'$gte': float(start_ts)}}, {'date': {'$lte': float(end_ts)}}]},
+            include=[]
+        )
+        return {int(doc_id) for doc_id in result['ids'][0]}
+    return search
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк векторных хранилищ')
+    parser.add_argument('--docs', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=312, help='Размерность (312 у rubert-tiny-turbo)')
+    parser.add_argument('--days', type=int, default=365, help='Период дат корпуса в сутках')
+    parser.add_argument('--range-days', type=int, nargs='+', default=[1, 7, 30, 365])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--batch', type=int, default=1000, help='Размер пакета добавления (сегмента)')
+    parser.add_argument('--skip-chroma', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers, vectors, timestamps = make_corpus(args.docs, args.dim, args.days, 50, rng)
+
+    backends = {}
+    for dtype in ('float32', 'int8'):
+        start = time.perf_counter()
+        backends[f'index {dtype}'] = build_index(tempfile.mkdtemp(), dtype, vectors, timestamps, args.batch)
+        print(f"index {dtype}: построение {time.perf_counter() - start:.1f} с")
+    if not args.skip_chroma:
+        start = time.perf_counter()
+        backends['chroma'] = build_chroma(tempfile.mkdtemp(), vectors, timestamps, args.batch)
+        print(f"chroma: построение {time.perf_counter() - start:.1f} с")
+
+    print(f"{'range, days':>11} {'backend':>14} {'p50, ms':>9} {'p99, ms':>9} {'recall@k':>9}")
+    for range_days in args.range_days:
+        queries = make_queries(centers, args.queries, args.dim, rng)
+        starts = rng.uniform(timestamps.min(), max(timestamps.max() - range_days * 86400, timestamps.min()), args.queries)
+        ranges = [(start_ts, start_ts + range_days * 86400) for start_ts in starts]
+        truths = [
+            exact_top_k(vectors, timestamps, query, args.k, start_ts, end_ts)
+            for query, (start_ts, end_ts) in zip(queries, ranges)
+        ]
+        for name, search in backends.items():
+            p50, p99, recall = measure(search, queries, ranges, truths, args.k)
+            print(f"{range_days:>11} {name:>14} {p50:>9.2f} {p99:>9.2f} {recall:>9.3f}")
+
+if __name__ == '__main__':
+    main()
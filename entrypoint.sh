@@ -1,6 +1,6 @@
 #!/bin/bash
 
-rm -f news.db
+rm -f news.db news.db-wal news.db-shm
 
 python -m backend.launcher &
 
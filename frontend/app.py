@@ -1,3 +1,4 @@
+import json
 import streamlit as st
 import requests
 from datetime import datetime
@@ -25,7 +26,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Конфигурация API
-API_URL = "http://localhost:8000/ask"
+STREAM_API_URL = "http://localhost:8000/ask/stream"
 
 # Боковая панель
 with st.sidebar:
@@ -54,19 +55,35 @@ for message in st.session_state.messages:
         st.markdown(message["question"])
 
 
-# Функция для отправки запроса к API
-def query_api(question, start_date_str, end_date_str):
-    try:
-        response = requests.post(API_URL, json={
-            "question": question,
-            "start_date": start_date_str,
-            "end_date": end_date_str
-        })
+# Разбор потока Server-Sent Events на пары (событие, данные)
+def iter_sse(response):
+    event, data = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            data.append(line[len('data:'):].strip())
+        elif not line and event:
+            yield event, json.loads("\n".join(data))
+            event, data = None, []
+
+
+# Функция для потокового запроса к API: отдает фрагменты ответа, источники складывает в sources
+def stream_api(question, start_date_str, end_date_str, sources):
+    with requests.post(STREAM_API_URL, json={
+        "question": question,
+        "start_date": start_date_str,
+        "end_date": end_date_str
+    }, stream=True) as response:
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Ошибка при обращении к API: {str(e)}")
-        return None
+        response.encoding = 'utf-8'
+        for event, data in iter_sse(response):
+            if event == 'sources':
+                sources.extend(data)
+            elif event == 'token':
+                yield data
+            elif event == 'error':
+                raise RuntimeError(data['detail'])
 
 
 # Функция для обработки ввода пользователя
@@ -80,14 +97,22 @@ def handle_user_input(question, start_date_str, end_date_str):
     with st.chat_message("user"):
         st.markdown(question)
 
-    with st.spinner('AI думает...'):
-        api_response = query_api(question, start_date_str, end_date_str)
-
-    if api_response and 'answer' in api_response:
-        bot_response = api_response['answer']
+    # Ответ отображается по мере генерации
+    sources = []
+    with st.chat_message("assistant"):
+        try:
+            bot_response = st.write_stream(stream_api(question, start_date_str, end_date_str, sources))
+        except (requests.exceptions.RequestException, RuntimeError) as e:
+            st.error(f"Ошибка при обращении к API: {str(e)}")
+            return
+
+        if sources:
+            with st.expander("Источники"):
+                for source in sources:
+                    st.markdown(f"- [{source['channel_id']}]({source['link']}) — {source['date'][:10]}")
+
+    if bot_response:
         st.session_state.messages.append({"role": "assistant", "question": bot_response})
-        with st.chat_message("assistant"):
-            st.markdown(bot_response)
     else:
         st.error("Не удалось получить корректный ответ от API.")
 
@@ -0,0 +1,69 @@
+"""
+Заглушка клиента Telethon для тестов ChannelDownloader без сети
+
+Реализует методы, которые использует загрузчик: start, get_entity,
+iter_messages и disconnect. Вызовы iter_messages записываются в calls.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from telethon.errors import FloodWaitError
+
+@dataclass
+class FakeMessage:
+    id: int
+    date: datetime
+    text: str
+    views: int = None
+    edit_date: datetime = None
+
+def make_messages(first_id: int, count: int) -> List[FakeMessage]:
+    """Сообщения с последовательными id и временем публикации"""
+    start = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+    return [
+        FakeMessage(message_id, start + timedelta(minutes=message_id), f"Новость про самокаты {message_id}")
+        for message_id in range(first_id, first_id + count)
+    ]
+
+class FakeTelegramClient:
+    """
+    Клиент с сообщениями каналов в памяти
+
+    Для каналов из flood_wait_once первый вызов iter_messages отдает одно
+    сообщение и затем завершается FloodWaitError.
+    """
+
+    def __init__(self, messages: Dict[str, List[FakeMessage]], flood_wait_once=(), flood_wait_seconds: int = 0):
+        self.messages = messages
+        self.flood_wait_pending = set(flood_wait_once)
+        self.flood_wait_seconds = flood_wait_seconds
+        self.calls: List[Dict] = []
+        self.connected = False
+
+    async def start(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    async def get_entity(self, channel_username: str):
+        if channel_username not in self.messages:
+            raise ValueError(f"Канал не найден: {channel_username}")
+        return channel_username
+
+    async def iter_messages(self, entity, limit: int = None, min_id: int = 0, reverse: bool = False):
+        self.calls.append({'channel': entity, 'limit': limit, 'min_id': min_id, 'reverse': reverse})
+        # Как в Telegram: без reverse - от новых к старым
+        messages = sorted(
+            (message for message in self.messages[entity] if message.id > min_id),
+            key=lambda message: message.id,
+            reverse=not reverse
+        )
+        if limit is not None:
+            messages = messages[:limit]
+        for position, message in enumerate(messages):
+            if position == 1 and entity in self.flood_wait_pending:
+                self.flood_wait_pending.discard(entity)
+                raise FloodWaitError(request=None, capture=self.flood_wait_seconds)
+            yield message
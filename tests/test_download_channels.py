@@ -0,0 +1,64 @@
+import asyncio
+import os
+
+from backend.download_channels import ChannelDownloader, STATE_FILE_NAME, load_last_message_id
+from tests.fake_telegram import FakeTelegramClient, make_messages
+
+def download(downloader, channels):
+    return asyncio.run(downloader.download_all(channels))
+
+def read_ids(directory):
+    """Идентификаторы сообщений во всех файлах выгрузки канала"""
+    ids = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('messages'):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                ids.extend(int(line.rsplit('/', 1)[1].rstrip(']\n')) for line in f if line.startswith('[MESSAGE_LINK:'))
+    return sorted(ids)
+
+def test_flood_wait_retry_removes_partial_file(tmp_path):
+    client = FakeTelegramClient({'news': make_messages(1, 5)}, flood_wait_once={'news'})
+    downloader = ChannelDownloader(client=client, output_format='txt')
+
+    result = download(downloader, {'news': {'limit': 10, 'output_dir': str(tmp_path)}})
+
+    assert os.path.exists(result['news'])
+    assert len(client.calls) == 2
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+    assert read_ids(tmp_path) == [1, 2, 3, 4, 5]
+    assert load_last_message_id(str(tmp_path)) == 5
+
+def test_high_water_mark_limits_first_run_and_uses_min_id_later(tmp_path):
+    messages = make_messages(1, 5)
+    client = FakeTelegramClient({'news': messages})
+    downloader = ChannelDownloader(client=client, output_format='txt')
+    channels = {'news': {'limit': 3, 'output_dir': str(tmp_path)}}
+
+    download(downloader, channels)
+    assert client.calls[-1] == {'channel': 'news', 'limit': 3, 'min_id': 0, 'reverse': False}
+    assert read_ids(tmp_path) == [3, 4, 5]
+    assert load_last_message_id(str(tmp_path)) == 5
+
+    # Новых сообщений нет: файл не создается, отметка не меняется
+    assert download(downloader, channels)['news'] is None
+    assert client.calls[-1] == {'channel': 'news', 'limit': None, 'min_id': 5, 'reverse': True}
+
+    messages.extend(make_messages(6, 2))
+    download(downloader, channels)
+    assert client.calls[-1] == {'channel': 'news', 'limit': None, 'min_id': 5, 'reverse': True}
+    assert read_ids(tmp_path) == [3, 4, 5, 6, 7]
+    with open(tmp_path / STATE_FILE_NAME, 'r', encoding='utf-8') as f:
+        assert f.read() == '7'
+
+def test_failed_channel_does_not_stop_others(tmp_path):
+    client = FakeTelegramClient({'news': make_messages(1, 2)})
+    downloader = ChannelDownloader(client=client, max_retries=1, retry_delay=0, output_format='jsonl')
+
+    result = download(downloader, {
+        'news': {'limit': 10, 'output_dir': str(tmp_path / 'news')},
+        'missing': {'limit': 10, 'output_dir': str(tmp_path / 'missing')}
+    })
+
+    assert result['news'].endswith('.jsonl')
+    assert isinstance(result['missing'], ValueError)
+    assert load_last_message_id(str(tmp_path / 'news')) == 2